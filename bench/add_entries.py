@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+
+"""
+Times ReorderableList.add_entries for growing numbers of entries,
+to check that the time per entry stays flat, up to 50k entries.
+Needs a display.
+
+    python bench/add_entries.py [n_max]
+"""
+
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Tkinter as tk
+import tkform
+
+
+def time_add_entries(root, n, batch_size=1000):
+    """
+    Returns the seconds to add n entries, in batches of batch_size
+    as a ListLoader does, including the layout of the rows.
+    """
+    reorderable_list = tkform.ReorderableList(root)
+    start = time.time()
+    for i_start in range(0, n, batch_size):
+        reorderable_list.add_entries([
+            ('/data/file%d.txt' % i, 'file%d' % i)
+            for i in range(i_start, min(n, i_start + batch_size))])
+        root.update_idletasks()
+    seconds = time.time() - start
+    reorderable_list.destroy()
+    return seconds
+
+
+def main():
+    n_max = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    root = tk.Tk()
+    print '%8s %10s %14s' % ('entries', 'seconds', 'us per entry')
+    for n in [1000, 2000, 5000, 10000, 20000, 50000]:
+        if n > n_max:
+            break
+        seconds = time_add_entries(root, n)
+        print '%8d %10.2f %14.1f' % (n, seconds, 1E6*seconds/n)
+    root.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+
+"""
+Checks that adding and deleting rows of a ReorderableList doesn't
+leak Tk widgets, commands or variables, without and with a pool of
+deleted rows. Needs a display.
+
+    python bench/leak_rows.py [n_cycle]
+"""
+
+
+import os
+import sys
+import gc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Tkinter as tk
+import tkform
+
+
+def count_tk_objects(root, reorderable_list):
+    gc.collect()
+    return (
+        len(reorderable_list.winfo_children()),
+        len(root.tk.call('info', 'commands')),
+        len(root.tk.call('info', 'globals')))
+
+
+def churn(root, pool_size, n_cycle):
+    """
+    Adds and deletes rows n_cycle times, and returns the counts of
+    child widgets, Tcl commands and Tcl variables before and after.
+    """
+    reorderable_list = tkform.ReorderableList(root, pool_size=pool_size)
+
+    def cycle(i):
+        reorderable_list.add_entries([
+            ('file%d-a' % i, 'label a'),
+            ('file%d-b' % i, 'label b'),
+            ('file%d-c' % i, None)])
+        while reorderable_list.rows:
+            reorderable_list.delete_param(0)
+        root.update_idletasks()
+
+    # fills the pool before counting
+    for i in range(10):
+        cycle(i)
+    before = count_tk_objects(root, reorderable_list)
+    for i in range(n_cycle):
+        cycle(i)
+    after = count_tk_objects(root, reorderable_list)
+    reorderable_list.destroy()
+    return before, after
+
+
+def main():
+    n_cycle = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    root = tk.Tk()
+    is_leak = False
+    for pool_size in [0, 5]:
+        before, after = churn(root, pool_size, n_cycle)
+        print 'pool_size=%d after %d cycles' % (pool_size, n_cycle)
+        for name, n_before, n_after in zip(
+                ['widgets', 'commands', 'variables'], before, after):
+            print '  %-10s %6d -> %6d' % (name, n_before, n_after)
+            if n_after > n_before:
+                is_leak = True
+    root.destroy()
+    if is_leak:
+        print 'LEAK'
+        sys.exit(1)
+    print 'no leak'
+
+
+if __name__ == '__main__':
+    main()
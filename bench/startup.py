@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+
+"""
+Times the start of a form: the import of tkform, with Tkinter
+already loaded, and, if there is a display, the time from creating
+a form to its first paint.
+
+    python bench/startup.py [n_run]
+"""
+
+
+import os
+import sys
+import subprocess
+import time
+
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(this_dir)
+
+
+import_script = """
+import sys, time
+sys.path.insert(0, %r)
+import Tkinter
+start = time.time()
+import tkform
+print (time.time() - start)*1000.0
+""" % repo_dir
+
+
+paint_script = """
+import sys, time
+sys.path.insert(0, %r)
+start = time.time()
+import tkform
+
+form = tkform.Form('Startup', 600, 400)
+form.push_text('Startup', 20)
+form.push_file_list_param('files', '+ files')
+form.push_labeled_param('label', 'Enter label', 'label')
+form.push_checkbox_param('check', 'Check')
+form.push_radio_param('radio', ['a', 'b', 'c'])
+form.push_submit()
+form.push_output()
+form.update()
+print (time.time() - start)*1000.0
+form.destroy()
+""" % repo_dir
+
+
+def time_script(script, n_run):
+    "Returns the times in ms printed by script, run in n_run processes."
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for i in range(n_run):
+            output = subprocess.check_output(
+                [sys.executable, '-c', script], stderr=devnull)
+            times.append(float(output.split()[-1]))
+    return times
+
+
+def report(name, times):
+    times = sorted(times)
+    print '%-28s min %6.1f ms  median %6.1f ms' % (
+        name, times[0], times[len(times)//2])
+
+
+def main():
+    n_run = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    report('import tkform', time_script(import_script, n_run))
+    try:
+        times = time_script(paint_script, n_run)
+    except subprocess.CalledProcessError:
+        print 'first paint: skipped, no display'
+        return
+    report('import to first paint', times)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,17 +9,65 @@ Includes
 - scrollable page
 - simple entry of params
 - reordable lists of files or directories
+- a headless mode that turns params into command-line options
 """
 
 
 import os
+import sys
 import traceback
+import time
 import re
+import bisect
 import collections
+import itertools
+import thread
+import threading
+import Queue
+import subprocess
+import fnmatch
+import glob
+import codecs
+import hashlib
+import json
+import cPickle as pickle
+import tempfile
+import shutil
+import atexit
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+def is_headless():
+    """
+    Forms run without Tkinter if the environment variable
+    TKFORM_HEADLESS is set, or if the script is called with --headless.
+    """
+    return bool(os.environ.get('TKFORM_HEADLESS')) or '--headless' in sys.argv
+
+
+class HeadlessTk(object):
+
+    """
+    Stands in for the Tkinter module in headless mode, so that the
+    widget classes can be defined without importing Tkinter.
+    """
+
+    Frame = Text = Tk = object
+
 
-import Tkinter as tk
-import tkFileDialog
-from idlelib.WidgetRedirector import WidgetRedirector
+# tkFileDialog, idlelib, multiprocessing and argparse are imported
+# where they are first needed, to speed up the start of a form
+if is_headless():
+    tk = HeadlessTk
+else:
+    import Tkinter as tk
 
 
 class VerticalScrolledFrame(tk.Frame):
@@ -31,6 +79,10 @@ class VerticalScrolledFrame(tk.Frame):
     - construct and pack/place/grid normally
     - only allows vertical scrolling
     - adapted from http://stackoverflow.com/a/16198198
+    - functions in 'scroll_callbacks' are called whenever the
+      visible part of the interior changes
+    - resizes are handled once per idle cycle, however many
+      <Configure> events arrive
     """
 
     def __init__(self, parent, *args, **kw):
@@ -41,10 +93,12 @@ class VerticalScrolledFrame(tk.Frame):
         vscrollbar.pack(fill=tk.Y, side=tk.RIGHT, expand=tk.FALSE)
         hscrollbar = tk.Scrollbar(self, orient=tk.HORIZONTAL)
         hscrollbar.pack(fill=tk.X, side=tk.BOTTOM, expand=tk.FALSE)
+        self.vscrollbar = vscrollbar
+        self.scroll_callbacks = []
 
         self.canvas = tk.Canvas(
             self, bd=0, highlightthickness=0,
-            yscrollcommand=vscrollbar.set,
+            yscrollcommand=self._on_yscroll,
             xscrollcommand=hscrollbar.set)
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=tk.TRUE)
         vscrollbar.config(command=self.canvas.yview)
@@ -60,15 +114,80 @@ class VerticalScrolledFrame(tk.Frame):
             0, 0, window=self.interior, anchor=tk.NW)
 
         # track changes to canvas, frame and updates scrollbar
-        self.interior.bind('<Configure>', self._configure_interior)
-        self.canvas.bind('<Configure>', self._configure_canvas)
+        self.configure_id = None
+        self.interior.bind('<Configure>', self._schedule_configure)
+        self.canvas.bind('<Configure>', self._schedule_configure)
+
+        # Windows and MacOS send <MouseWheel>, X11 sends buttons 4 and 5
+        self.windowing_system = self.tk.call('tk', 'windowingsystem')
+        self.wheel_pixels = 0.0
         self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind_all("<Button-4>", self._on_mousewheel)
+        self.canvas.bind_all("<Button-5>", self._on_mousewheel)
 
         # pixels '2', millimeters '2m', centimeters '2c', or inches '2i'
-        self.canvas.configure(yscrollincrement='8')
+        self.scroll_increment = 8
+        self.wheel_step = 40
+        self.canvas.configure(yscrollincrement=str(self.scroll_increment))
+
+    def _on_yscroll(self, *args):
+        # called by the canvas on scrolling and on changes of size
+        self.vscrollbar.set(*args)
+        for callback in self.scroll_callbacks:
+            callback()
 
     def _on_mousewheel(self, event):
-        self.canvas.yview_scroll(-1 * (event.delta), "units")
+        # scroll wheel_step pixels per notch of the wheel, keeping
+        # the remainder for smooth scrolling with fine-grained wheels
+        if self.is_self_scrolled(event.widget):
+            return
+        if event.num == 4:
+            pixels = -self.wheel_step
+        elif event.num == 5:
+            pixels = self.wheel_step
+        elif self.windowing_system == 'aqua':
+            # aqua sends small deltas, many per flick of a trackpad
+            pixels = -event.delta * self.scroll_increment
+        else:
+            pixels = -event.delta / 120.0 * self.wheel_step
+        owner = self.get_wheel_owner(event.widget)
+        if owner is not None:
+            owner.scroll_wheel(pixels)
+            return
+        self.wheel_pixels += pixels
+        units = int(self.wheel_pixels / self.scroll_increment)
+        if units:
+            self.wheel_pixels -= units * self.scroll_increment
+            self.canvas.yview_scroll(units, "units")
+
+    def is_self_scrolled(self, widget):
+        """
+        Returns True if widget is a Text or Listbox with more content
+        than it shows, which it scrolls with its own wheel bindings.
+        """
+        if not isinstance(widget, (tk.Text, tk.Listbox)):
+            return False
+        return tuple(widget.yview()) != (0.0, 1.0)
+
+    def get_wheel_owner(self, widget):
+        """
+        Returns the widget under the mouse, or a parent of it, that
+        scrolls itself with a `scroll_wheel` method, or None.
+        """
+        while widget is not None and widget is not self:
+            if hasattr(widget, 'scroll_wheel'):
+                return widget
+            widget = getattr(widget, 'master', None)
+        return None
+
+    def _schedule_configure(self, event):
+        if self.configure_id is None:
+            self.configure_id = self.after_idle(self._configure)
+
+    def _configure(self):
+        self.configure_id = None
+        self._configure_interior(None)
+        self._configure_canvas(None)
 
     def _configure_interior(self, event):
         # update the scrollbars to match the size of the inner frame
@@ -115,12 +234,16 @@ class RowOfWidgets():
 
         self.delete_widget = tk.Label(parent, text=" [x]")
 
+        self.i_row = None
+
     def init_custom_widgets(self):
         # Here's where you build widgets 
         pass
 
     def add_to_grid(self, i_row):
-        self.num_stringvar.set(u'\u2630 %d.' % (i_row+1) )
+        if i_row != self.i_row:
+            self.num_stringvar.set(u'\u2630 %d.' % (i_row+1) )
+            self.i_row = i_row
         self.widgets = []
         self.widgets.append(self.num_widget)
         self.widgets.extend(self.custom_widgets)
@@ -132,6 +255,16 @@ class RowOfWidgets():
         for widget in self.widgets:
             widget.grid_forget()
 
+    def destroy(self):
+        for widget in [self.num_widget, self.delete_widget]:
+            widget.destroy()
+        for widget in self.custom_widgets:
+            widget.destroy()
+        self.widgets = []
+        self.custom_widgets = []
+        # break reference cycles through the callbacks
+        self.callbacks = []
+
     def in_y(self, event):
         y = event.y_root
         y0 = self.num_widget.winfo_rooty()
@@ -152,9 +285,28 @@ class ReorderableWidgetList(tk.Frame):
     - can be reordered by dragging on the arrow character on
     the left
     - deleted by clicking on the x on the right
-    - dynamically added to through `add_row_of_widgets`
+    - dynamically added to through `add_row_of_widgets`, or
+    `add_rows_of_widgets` to grid many rows in one go
+
+    The y-bounds of the rows are cached for hit-testing mouse events,
+    and are rebuilt after the table is resized or rows are added or
+    deleted.
+
+    Drag events are coalesced: only the latest pointer position is
+    applied, at most once every `drag_interval` ms, and on release.
+
+    Functions registered with `add_change_callback` are called when
+    rows are added, deleted, moved or relabeled. Edits in the custom
+    widgets of rows are not notified, so `is_change_tracked` is False,
+    and forms read the values of the list on every `get_params`.
+
+    Rows are selected by control-clicking their number, and shift-click
+    selects a range. `delete_selected`, `move_selected` and `sort`
+    change any number of rows with a single regrid.
     """
 
+    is_change_tracked = False
+
     def __init__(self, parent):
         tk.Frame.__init__(self, parent)
         self.parent = parent
@@ -162,79 +314,641 @@ class ReorderableWidgetList(tk.Frame):
         self.rows = []
         self.i_select = -1
 
+        self.row_tops = None
+        self.row_heights = None
+        self.num_width = 0
+        self.root_x = 0
+        self.root_y = 0
+        self.bind('<Configure>', self.invalidate_geometry)
+
+        self.drag_interval = 16
+        self.drag_y_root = None
+        self.drag_id = None
+
+        self.change_callbacks = []
+
+        self.selected_keys = set()
+        self.i_anchor = -1
+        self.select_color = '#9999FF'
+
+    def add_change_callback(self, callback):
+        self.change_callbacks.append(callback)
+
+    def notify_change(self):
+        for callback in self.change_callbacks:
+            callback()
+
     def add_row_of_widgets(self, row_of_widgets):
-        self.rows.append(row_of_widgets)
-        self.clear_frame()
-        self.build_frame()
+        self.add_rows_of_widgets([row_of_widgets])
+
+    def add_rows_of_widgets(self, rows_of_widgets):
+        # only the new rows at the end need to be gridded
+        i_start = len(self.rows)
+        self.rows.extend(rows_of_widgets)
+        self.invalidate_geometry()
+        for row in rows_of_widgets:
+            row.delete_widget.bind(
+                "<ButtonPress-1>",
+                self.get_delete_callback(row))
+        self.regrid_rows(i_start)
+        self.notify_change()
 
     def clear_frame(self):
         for row in self.rows:
             row.grid_forget()
 
     def delete_param(self, i):
-        print i
-        self.clear_frame()
+        row = self.rows[i]
+        self.selected_keys.discard(row)
+        row.grid_forget()
         del self.rows[i]
-        self.build_frame()
-
-    def get_delete_callback(self, i):
-        return lambda event: self.delete_param(i)
+        self.release_row(row)
+        self.invalidate_geometry()
+        self.regrid_rows(i)
+        self.notify_change()
+
+    def release_row(self, row):
+        "Called with a row that has been deleted from the table."
+        row.destroy()
+
+    def get_delete_callback(self, row):
+        # row.i_row is kept up to date by regrid_rows, so the
+        # callback stays valid when rows are moved or deleted
+        return lambda event: self.delete_param(row.i_row)
+
+    def regrid_rows(self, i_start, i_end=None):
+        "Re-grids rows[i_start:i_end] that have changed position."
+        if i_end is None:
+            i_end = len(self.rows)
+        for i in range(i_start, i_end):
+            self.rows[i].add_to_grid(i)
 
     def build_frame(self):
-        for i, row in enumerate(self.rows):
-            row.add_to_grid(i)
-            row.delete_widget.bind(
-                "<ButtonPress-1>",
-                self.get_delete_callback(i))
+        self.regrid_rows(0)
+
+    def invalidate_geometry(self, event=None):
+        self.row_tops = None
+
+    def cache_geometry(self):
+        """
+        Caches the top and height of the grid cells of every row,
+        relative to the table, so that rows can be found by bisection.
+        """
+        self.update_idletasks()
+        self.row_tops = []
+        self.row_heights = []
+        for i in range(len(self.rows)):
+            x, y, width, height = self.grid_bbox(0, i)
+            self.row_tops.append(y)
+            self.row_heights.append(height)
+        if self.rows:
+            self.num_width = self.grid_bbox(0, 0)[2]
+
+    def move_geometry(self, i, j):
+        "Updates the cached bounds after row i is moved to j."
+        if self.row_tops is None:
+            return
+        heights = self.row_heights
+        heights.insert(j, heights.pop(i))
+        for k in range(min(i, j), max(i, j)):
+            self.row_tops[k+1] = self.row_tops[k] + heights[k]
 
     def get_i_from_y(self, event):
-        for i, row in enumerate(self.rows):
-            if row.in_y(event):
-                return i
-        return -1
+        return self.get_i_from_y_root(event.y_root)
+
+    def get_i_from_y_root(self, y_root):
+        if self.row_tops is None:
+            self.cache_geometry()
+        y = y_root - self.root_y
+        i = bisect.bisect_right(self.row_tops, y) - 1
+        if i < 0 or y > self.row_tops[i] + self.row_heights[i]:
+            return -1
+        return i
 
     def get_i_from_xy(self, event):
-        for i, row in enumerate(self.rows):
-            if row.contains_event(event):
-                return i
-        return -1
+        x = event.x_root - self.root_x
+        if not 0 <= x <= self.num_width:
+            return -1
+        return self.get_i_from_y(event)
 
     def contains_event(self, event):
         return is_event_in_widget(event, self)
 
     def mouse_down(self, event):
-        self.i_select = self.get_i_from_xy(event)
-        if self.i_select == -1:
+        # origin of the table on screen, kept for the whole drag
+        self.root_x = self.winfo_rootx()
+        self.root_y = self.winfo_rooty()
+        if self.row_tops is None:
+            self.cache_geometry()
+        self.i_select = -1
+        i = self.get_i_from_xy(event)
+        if i == -1:
+            return
+        # shift is 0x1 and control is 0x4 in event.state
+        if event.state & 0x5:
+            self.select_row(i, event.state & 0x1)
             return
-        row = self.rows[self.i_select]
-        row.num_widget.configure(background='#FF9999')
+        if self.selected_keys:
+            self.clear_selection()
+        self.i_select = i
+        self.set_row_color(self.i_select, '#FF9999')
 
     def mouse_up(self, event):
         if self.i_select == -1:
             return
-        row = self.rows[self.i_select]
-        row.num_widget.configure(background='white')
+        self.drag_y_root = event.y_root
+        self.apply_drag()
+        self.set_row_color(self.i_select, self.get_row_color(self.i_select))
+        self.i_select = -1
 
     def mouse_drag(self, event):
-        self.i_mouse_drag = self.get_i_from_y(event)
-        if self.i_select == -1 or self.i_mouse_drag == -1:
+        if self.i_select == -1:
+            return
+        self.drag_y_root = event.y_root
+        if self.drag_id is None:
+            self.drag_id = self.after(self.drag_interval, self.apply_drag)
+
+    def apply_drag(self):
+        "Moves the selected row to the row under the last drag position."
+        if self.drag_id is not None:
+            self.after_cancel(self.drag_id)
+            self.drag_id = None
+        if self.i_select == -1 or self.drag_y_root is None:
+            return
+        i_mouse_drag = self.get_i_from_y_root(self.drag_y_root)
+        self.drag_y_root = None
+        if i_mouse_drag == -1 or i_mouse_drag == self.i_select:
             return
-        if self.i_select == self.i_mouse_drag:
+        self.move_row(self.i_select, i_mouse_drag)
+        self.i_select = i_mouse_drag
+
+    def set_row_color(self, i, color):
+        self.rows[i].num_widget.configure(background=color)
+
+    def get_row_color(self, i):
+        if self.get_item_key(self.get_items()[i]) in self.selected_keys:
+            return self.select_color
+        return 'white'
+
+    def move_row(self, i, j):
+        "Moves row i to position j, shifting the rows in between."
+        self.rows.insert(j, self.rows.pop(i))
+        self.regrid_rows(min(i, j), max(i, j) + 1)
+        self.move_geometry(i, j)
+        self.notify_change()
+
+    def get_items(self):
+        "Returns the items that hold the rows, in order."
+        return self.rows
+
+    def get_item_key(self, item):
+        "Returns the key of an item in `selected_keys`."
+        return item
+
+    def get_item_value(self, item):
+        return item.get()
+
+    def get_item_label(self, item):
+        "Returns the label of an item, or '' if it has none."
+        label_stringvar = getattr(item, 'label_stringvar', None)
+        if label_stringvar is None:
+            return ''
+        return label_stringvar.get()
+
+    def set_items(self, items, deleted_items=()):
+        "Replaces the rows with items, and regrids them once."
+        for row in deleted_items:
+            row.grid_forget()
+            self.release_row(row)
+        self.rows = list(items)
+        self.invalidate_geometry()
+        self.regrid_rows(0)
+        self.notify_change()
+
+    def select_row(self, i, is_range=False):
+        "Toggles the selection of row i, or selects from the last row."
+        items = self.get_items()
+        if is_range and 0 <= self.i_anchor < len(items):
+            for j in range(min(i, self.i_anchor), max(i, self.i_anchor) + 1):
+                self.selected_keys.add(self.get_item_key(items[j]))
+                self.set_row_color(j, self.select_color)
+            return
+        key = self.get_item_key(items[i])
+        if key in self.selected_keys:
+            self.selected_keys.remove(key)
+        else:
+            self.selected_keys.add(key)
+        self.i_anchor = i
+        self.set_row_color(i, self.get_row_color(i))
+
+    def get_selected_items(self):
+        return [
+            item for item in self.get_items()
+            if self.get_item_key(item) in self.selected_keys]
+
+    def clear_selection(self):
+        selected_keys = self.selected_keys
+        self.selected_keys = set()
+        self.i_anchor = -1
+        for i, item in enumerate(self.get_items()):
+            if self.get_item_key(item) in selected_keys:
+                self.set_row_color(i, 'white')
+
+    def delete_selected(self):
+        "Deletes the selected rows."
+        if not self.selected_keys:
             return
-        i, j = self.i_mouse_drag, self.i_select
-        self.rows[i], self.rows[j] = self.rows[j], self.rows[i]
-        self.clear_frame()
-        self.build_frame()
-        self.i_select = self.i_mouse_drag
-        self.i_mouse_drag = -1
+        items = self.get_items()
+        kept_items = [
+            item for item in items
+            if self.get_item_key(item) not in self.selected_keys]
+        deleted_items = self.get_selected_items()
+        self.selected_keys = set()
+        self.i_anchor = -1
+        self.set_items(kept_items, deleted_items)
+
+    def move_selected(self, is_top=True):
+        "Moves the selected rows to the top, or the bottom, in order."
+        if not self.selected_keys:
+            return
+        selected_items = self.get_selected_items()
+        other_items = [
+            item for item in self.get_items()
+            if self.get_item_key(item) not in self.selected_keys]
+        if is_top:
+            self.set_items(selected_items + other_items)
+        else:
+            self.set_items(other_items + selected_items)
+        self.i_anchor = -1
+
+    def sort(self, key='entry', reverse=False):
+        """
+        Sorts the rows by 'entry', 'label', or by key(value), where
+        value is the list of values of a row, as returned by `get`.
+        """
+        if key == 'entry':
+            item_key = lambda item: self.get_item_value(item)[0]
+        elif key == 'label':
+            item_key = self.get_item_label
+        else:
+            item_key = lambda item: key(self.get_item_value(item))
+        items = sorted(self.get_items(), reverse=reverse, key=item_key)
+        self.i_anchor = -1
+        self.set_items(items)
 
     def get(self):
         return [e.get() for e in self.rows]
 
 
+class FileInfoCache(object):
+
+    """
+    Reads the metadata of files on a pool of worker threads. The
+    metadata of a path is a dict with 'size', 'mtime' and, if asked
+    for, 'hash', the sha1 of the contents of a file. It is cached by
+    (path, mtime, size), so unchanged files are never read again.
+    """
+
+    def __init__(self, n_workers=4):
+        self.n_workers = n_workers
+        self.requests = None
+        self.threads = []
+        self.infos = {}
+        self.keys = {}
+
+    def request(self, path, is_hash, callback):
+        "Calls callback(info) on a worker thread once info is read."
+        if not self.threads:
+            self.requests = Queue.Queue()
+            for i in range(self.n_workers):
+                thread = threading.Thread(target=self.work)
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+        self.requests.put((path, is_hash, callback))
+
+    def work(self):
+        while True:
+            path, is_hash, callback = self.requests.get()
+            info = {}
+            try:
+                info = self.get_info(path, is_hash)
+            except (IOError, OSError):
+                pass
+            except Exception:
+                # the worker is kept for the next requests
+                traceback.print_exc()
+            finally:
+                callback(info)
+
+    def get_info(self, path, is_hash=False):
+        stat = os.stat(path)
+        key = (path, stat.st_mtime, stat.st_size)
+        info = self.infos.get(key)
+        if info is None:
+            info = {'size': stat.st_size, 'mtime': stat.st_mtime}
+            # only the latest version of a path is kept
+            self.infos.pop(self.keys.get(path), None)
+            self.keys[path] = key
+            self.infos[key] = info
+        if is_hash and 'hash' not in info:
+            info['hash'] = get_file_hash(path)
+        return info
+
+
+def get_file_hash(path):
+    "Returns the sha1 of a file, or None for a directory."
+    if os.path.isdir(path):
+        return None
+    hasher = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(1 << 20)
+            if not data:
+                break
+            hasher.update(data)
+    return hasher.hexdigest()
+
+
+def format_file_info(column, value):
+    if value is None:
+        return '?'
+    if column == 'size':
+        for unit in ['B', 'KB', 'MB', 'GB']:
+            if value < 1024 or unit == 'GB':
+                break
+            value /= 1024.0
+        if unit == 'B':
+            return '%d B' % value
+        return '%.1f %s' % (value, unit)
+    if column == 'mtime':
+        return time.strftime('%Y-%m-%d %H:%M', time.localtime(value))
+    return value[:8]
+
+
+# shared by all lists, so that files are only read once
+file_info_cache = FileInfoCache()
+
+
+def list_dir(path):
+    """
+    Returns the names of the sub-directories and files in path.
+    As in os.walk, links to directories are not in the
+    sub-directories, so that a link to a parent isn't searched again.
+    """
+    dir_names = []
+    file_names = []
+    if scandir is not None:
+        for dir_entry in scandir(path):
+            if dir_entry.is_dir(follow_symlinks=False):
+                dir_names.append(dir_entry.name)
+            elif not dir_entry.is_dir():
+                file_names.append(dir_entry.name)
+    else:
+        for name in os.listdir(path):
+            sub_path = os.path.join(path, name)
+            if not os.path.isdir(sub_path):
+                file_names.append(name)
+            elif not os.path.islink(sub_path):
+                dir_names.append(name)
+    return dir_names, file_names
+
+
+def is_name_included(name, include=None, exclude=None):
+    """
+    Returns False if name matches a glob pattern in exclude, or if
+    include is given and name matches none of its patterns.
+    """
+    if exclude:
+        for pattern in exclude:
+            if fnmatch.fnmatch(name, pattern):
+                return False
+    if include:
+        for pattern in include:
+            if fnmatch.fnmatch(name, pattern):
+                return True
+        return False
+    return True
+
+
+def walk_files(root, include=None, exclude=None):
+    "Yields the files under root, with the filters of DirScanner."
+    dir_names, file_names = list_dir(root)
+    for name in sorted(file_names):
+        if is_name_included(name, include, exclude):
+            yield os.path.join(root, name)
+    for name in sorted(dir_names):
+        if is_name_included(name, None, exclude):
+            sub_dir = os.path.join(root, name)
+            for fname in walk_files(sub_dir, include, exclude):
+                yield fname
+
+
+class DirScanner(object):
+
+    """
+    Finds the files under a directory on a pool of worker threads.
+    The file names are matched against the glob patterns in include
+    and exclude, and sub-directories that match exclude are skipped.
+    The files found are collected with `get_fnames`, in chunks of up
+    to chunk_size files.
+    """
+
+    def __init__(
+            self, root, include=None, exclude=None,
+            n_workers=4, chunk_size=1000):
+        self.root = root
+        self.include = include
+        self.exclude = exclude
+        self.n_workers = n_workers
+        self.chunk_size = chunk_size
+        self.dirs = Queue.Queue()
+        self.chunks = Queue.Queue()
+        self.lock = threading.Lock()
+        self.n_pending_dirs = 0
+        self.n_found = 0
+        self.is_cancelled = False
+        self.is_done = False
+
+    def start(self):
+        self.n_pending_dirs = 1
+        self.dirs.put(self.root)
+        for i in range(self.n_workers):
+            thread = threading.Thread(target=self.work)
+            thread.daemon = True
+            thread.start()
+
+    def cancel(self):
+        self.is_cancelled = True
+        self.finish()
+
+    def finish(self):
+        self.is_done = True
+        # wakes up the workers so that they exit
+        for i in range(self.n_workers):
+            self.dirs.put(None)
+
+    def work(self):
+        while True:
+            path = self.dirs.get()
+            if path is None or self.is_cancelled:
+                return
+            sub_dirs = []
+            try:
+                sub_dirs = self.scan_dir(path)
+            except Exception:
+                # the worker is kept for the next directories
+                traceback.print_exc()
+            finally:
+                # a failed directory still counts as done, so that
+                # is_done is set once the others are scanned
+                with self.lock:
+                    self.n_pending_dirs += len(sub_dirs) - 1
+                    is_finished = self.n_pending_dirs == 0
+                for sub_dir in sorted(sub_dirs):
+                    self.dirs.put(sub_dir)
+                if is_finished:
+                    self.finish()
+
+    def scan_dir(self, path):
+        "Puts the files of path in chunks, and returns its sub-dirs."
+        try:
+            dir_names, file_names = list_dir(path)
+        except (IOError, OSError):
+            dir_names, file_names = [], []
+        sub_dirs = [
+            os.path.join(path, name) for name in dir_names
+            if is_name_included(name, None, self.exclude)]
+        fnames = [
+            os.path.join(path, name) for name in sorted(file_names)
+            if is_name_included(name, self.include, self.exclude)]
+        for i in range(0, len(fnames), self.chunk_size):
+            self.chunks.put(fnames[i:i + self.chunk_size])
+        with self.lock:
+            self.n_found += len(fnames)
+        return sub_dirs
+
+    def get_fnames(self, max_n=None):
+        "Returns up to about max_n of the files found so far."
+        if max_n is None:
+            max_n = self.chunk_size
+        fnames = []
+        while len(fnames) < max_n:
+            try:
+                fnames.extend(self.chunks.get_nowait())
+            except Queue.Empty:
+                break
+        return fnames
+
+
 class ReorderableList(ReorderableWidgetList):
 
-    def add_entry_label(self, entry, label=None, width=None):
+    """
+    A ReorderableWidgetList of entries with optional editable labels.
+    If `is_unique`, entries that are already in the list are not added
+    again, which is checked in an index of the entries.
+
+    Deleted rows are destroyed, unless `pool_size` is set, in which
+    case up to `pool_size` deleted rows are kept and reused by later
+    calls to `add_entry_label`.
+
+    `metadata` is a list of columns out of 'size', 'mtime' and 'hash',
+    shown after the label of each row, and added in that order after
+    [entry, label] in `get`. They are read by `file_info_cache` in the
+    background, and are None in `get` until they arrive.
+
+    Every change of the entries and labels is notified, but not edits
+    in the widgets that a subclass adds to rows, so `is_change_tracked`
+    is only set on the lists made by `Form.make_list`.
+    """
+
+    def __init__(self, parent, pool_size=0, metadata=None):
+        ReorderableWidgetList.__init__(self, parent)
+        self.pool_size = pool_size
+        # deleted rows, keyed by whether they have a label
+        self.pool = {True: [], False: []}
+        self.is_unique = True
+        self.entry_index = set()
+
+        self.metadata = list(metadata or [])
+        for column in self.metadata:
+            if column not in ('size', 'mtime', 'hash'):
+                raise ValueError('Unknown metadata column %r' % column)
+        self.info_queue = None
+        self.info_poll_interval = 50
+        self.n_pending_infos = 0
+
+    def request_file_info(self, row):
+        "Shows placeholders in row until its metadata is read."
+        if not self.metadata:
+            return
+        if self.info_queue is None:
+            self.info_queue = Queue.Queue()
+        token = object()
+        row.info_token = token
+        row.info = {}
+        for column in self.metadata:
+            row.info_widgets[column].configure(text='...')
+
+        def callback(info):
+            self.info_queue.put((row, token, info))
+
+        file_info_cache.request(
+            row.entry, 'hash' in self.metadata, callback)
+        self.n_pending_infos += 1
+        if self.n_pending_infos == 1:
+            self.after(self.info_poll_interval, self.poll_file_infos)
+
+    def poll_file_infos(self):
+        is_changed = False
+        while True:
+            try:
+                row, token, info = self.info_queue.get_nowait()
+            except Queue.Empty:
+                break
+            self.n_pending_infos -= 1
+            if row.info_token is not token:
+                # the row was deleted or reused since the request
+                continue
+            row.info = info
+            for column in self.metadata:
+                row.info_widgets[column].configure(
+                    text=format_file_info(column, info.get(column)))
+            is_changed = True
+        if is_changed:
+            self.notify_change()
+        if self.n_pending_infos > 0:
+            self.after(self.info_poll_interval, self.poll_file_infos)
+
+    def has_entry(self, entry):
+        return entry in self.entry_index
+
+    def release_row(self, row):
+        self.entry_index.discard(row.entry)
+        row.info_token = None
+        row.num_widget.configure(background='white')
+        is_label = hasattr(row, 'label_widget')
+        if len(self.pool[is_label]) < self.pool_size:
+            self.pool[is_label].append(row)
+        else:
+            row.destroy()
+
+    def reuse_row(self, entry, label, width):
+        row = self.pool[label is not None].pop()
+        row.entry = entry
+        row.entry_widget.configure(text=entry)
+        if label is not None:
+            row.label = label
+            row.label_stringvar.set(label)
+            row.label_widget.configure(width=width)
+        row.i_row = None
+        self.request_file_info(row)
+        return row
+
+    def make_row(self, entry, label=None, width=None):
+        if self.pool[label is not None]:
+            return self.reuse_row(entry, label, width)
+
         row = RowOfWidgets(self)
 
         row.entry = entry
@@ -252,8 +966,307 @@ class ReorderableList(ReorderableWidgetList):
                 width=width)
             row.custom_widgets.append(row.label_widget)
             row.callbacks.append(row.label_stringvar.get)
+            row.label_stringvar.trace(
+                'w', lambda *args: self.notify_change())
+
+        row.info_widgets = {}
+        for column in self.metadata:
+            row.info_widgets[column] = tk.Label(self, fg='#666666')
+            row.custom_widgets.append(row.info_widgets[column])
+            row.callbacks.append(self.get_info_callback(row, column))
+        self.request_file_info(row)
 
-        self.add_row_of_widgets(row)
+        return row
+
+    def get_info_callback(self, row, column):
+        return lambda: row.info.get(column)
+
+    def add_entry_label(self, entry, label=None, width=None):
+        self.add_entries([(entry, label)], width)
+
+    def add_entries(self, entry_labels, width=None):
+        """
+        Adds a list of (entry, label) pairs, label can be None,
+        and grids the new rows once. Returns the number of rows added.
+        """
+        rows = []
+        for entry, label in entry_labels:
+            if self.is_unique and entry in self.entry_index:
+                continue
+            self.entry_index.add(entry)
+            rows.append(self.make_row(entry, label, width))
+        if rows:
+            self.add_rows_of_widgets(rows)
+        return len(rows)
+
+
+class RowSlot(object):
+
+    """
+    The widgets of one visible row of a VirtualReorderableList,
+    which are reused for whichever entry scrolls into view.
+    """
+
+    def __init__(self, parent, entry_width=50, label_width=None):
+        self.i = None
+        self.frame = tk.Frame(parent)
+
+        self.num_stringvar = tk.StringVar()
+        self.num_widget = tk.Label(
+            self.frame, textvariable=self.num_stringvar,
+            width=9, anchor=tk.W)
+        self.num_widget.pack(side=tk.LEFT)
+
+        self.entry_widget = tk.Label(
+            self.frame, width=entry_width, anchor=tk.W)
+        self.entry_widget.pack(side=tk.LEFT)
+
+        self.label_stringvar = tk.StringVar()
+        self.label_widget = tk.Entry(
+            self.frame, textvariable=self.label_stringvar,
+            width=label_width)
+        self.label_widget.pack(side=tk.LEFT)
+
+        self.delete_widget = tk.Label(self.frame, text=" [x]")
+        self.delete_widget.pack(side=tk.LEFT)
+
+
+class VirtualReorderableList(ReorderableWidgetList):
+
+    """
+    A ReorderableList for very long lists. The entries are kept in
+    `self.entries` as [entry] or [entry, label] lists. The list has
+    its own scrollbar, and shows up to `n_visible_row` rows at a time
+    in a viewport of fixed height, starting from row `i_first`. Only
+    the visible rows have widgets, which are recycled on scrolling,
+    so the size of the viewport doesn't depend on the number of
+    entries. All rows have the same height. As in ReorderableList,
+    entries are unique if `is_unique`, and `is_change_tracked` is
+    only set by `Form.make_list`.
+    """
+
+    def __init__(
+            self, parent, n_visible_row=20, entry_width=50,
+            label_width=None):
+        ReorderableWidgetList.__init__(self, parent)
+        self.n_visible_row = n_visible_row
+        self.entry_width = entry_width
+        self.label_width = label_width
+        self.entries = []
+        self.slots = []
+        self.row_height = None
+        self.i_first = 0
+        self.wheel_pixels = 0.0
+        self.i_highlight = -1
+        self.highlight_color = None
+
+        self.viewport = tk.Frame(self, height=1, width=1)
+        self.viewport.pack(side=tk.LEFT, anchor=tk.N)
+        self.scrollbar = tk.Scrollbar(
+            self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.LEFT, fill=tk.Y)
+
+        self.is_unique = True
+        self.entry_index = set()
+
+    def has_entry(self, entry):
+        return entry in self.entry_index
+
+    def add_entry_label(self, entry, label=None, width=None):
+        self.add_entries([(entry, label)])
+
+    def add_entries(self, entry_labels, width=None):
+        n_entry = len(self.entries)
+        for entry, label in entry_labels:
+            if self.is_unique and entry in self.entry_index:
+                continue
+            self.entry_index.add(entry)
+            if label is None:
+                self.entries.append([entry])
+            else:
+                self.entries.append([entry, label])
+        n_added = len(self.entries) - n_entry
+        if n_added:
+            self.resize()
+            self.notify_change()
+        return n_added
+
+    def make_slot(self):
+        slot = RowSlot(self.viewport, self.entry_width, self.label_width)
+        slot.label_stringvar.trace(
+            'w', lambda *args: self.on_label_change(slot))
+        slot.delete_widget.bind(
+            "<ButtonPress-1>", lambda event: self.delete_slot(slot))
+        if self.row_height is None:
+            self.update_idletasks()
+            self.row_height = slot.frame.winfo_reqheight()
+            self.num_width = slot.num_widget.winfo_reqwidth()
+            self.viewport.configure(width=slot.frame.winfo_reqwidth())
+        self.slots.append(slot)
+        return slot
+
+    def on_label_change(self, slot):
+        if slot.i is not None and len(self.entries[slot.i]) > 1:
+            self.entries[slot.i][1] = slot.label_stringvar.get()
+            self.notify_change()
+
+    def resize(self):
+        if not self.slots:
+            self.make_slot()
+        n_row = max(1, min(len(self.entries), self.n_visible_row))
+        self.viewport.configure(height=n_row*self.row_height)
+        self.invalidate_slots()
+
+    def invalidate_slots(self):
+        for slot in self.slots:
+            slot.i = None
+        self.refresh()
+
+    def get_visible_range(self):
+        n_entry = len(self.entries)
+        max_i_first = max(0, n_entry - self.n_visible_row)
+        self.i_first = min(max(0, self.i_first), max_i_first)
+        i_last = min(n_entry, self.i_first + self.n_visible_row)
+        return self.i_first, i_last
+
+    def yview(self, *args):
+        "Scrolls the viewport, with the arguments of a Scrollbar command."
+        if args[0] == 'moveto':
+            self.i_first = int(round(float(args[1])*len(self.entries)))
+        elif args[0] == 'scroll':
+            n = int(args[1])
+            if args[2] == 'pages':
+                n *= self.n_visible_row
+            self.i_first += n
+        self.refresh()
+
+    def scroll_wheel(self, pixels):
+        "Scrolls by pixels, keeping the remainder of a row for later."
+        if self.row_height is None:
+            return
+        self.wheel_pixels += pixels
+        n_row = int(self.wheel_pixels / self.row_height)
+        if n_row:
+            self.wheel_pixels -= n_row*self.row_height
+            self.yview('scroll', n_row, 'units')
+
+    def see(self, i):
+        "Scrolls the viewport to show row i."
+        if i < self.i_first:
+            self.i_first = i
+        elif i >= self.i_first + self.n_visible_row:
+            self.i_first = i - self.n_visible_row + 1
+
+    def refresh(self):
+        "Shows the visible entries in slots, making slots as needed."
+        if self.row_height is None:
+            return
+        i_first, i_last = self.get_visible_range()
+        n_entry = len(self.entries)
+        if n_entry:
+            self.scrollbar.set(
+                float(i_first)/n_entry, float(i_last)/n_entry)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        n_visible = i_last - i_first
+        while len(self.slots) < n_visible:
+            self.make_slot()
+        for i_slot, slot in enumerate(self.slots):
+            i = i_first + i_slot
+            if i >= i_last:
+                if slot.i is not None:
+                    slot.frame.place_forget()
+                    slot.i = None
+                continue
+            if slot.i != i:
+                self.fill_slot(slot, i)
+            if i == self.i_highlight:
+                slot.num_widget.configure(background=self.highlight_color)
+
+    def fill_slot(self, slot, i):
+        slot.i = None
+        slot.num_stringvar.set(u'\u2630 %d.' % (i+1))
+        slot.num_widget.configure(background=self.get_row_color(i))
+        entry_label = self.entries[i]
+        slot.entry_widget.configure(text=entry_label[0])
+        if len(entry_label) > 1:
+            slot.label_stringvar.set(entry_label[1])
+            slot.label_widget.pack(side=tk.LEFT, before=slot.delete_widget)
+        else:
+            slot.label_widget.pack_forget()
+        slot.frame.place(x=0, y=(i - self.i_first)*self.row_height)
+        slot.i = i
+
+    def cache_geometry(self):
+        self.root_y = self.viewport.winfo_rooty()
+
+    def get_i_from_y_root(self, y_root):
+        if self.row_height is None:
+            return -1
+        i_slot = int((y_root - self.root_y) // self.row_height)
+        # dragging past the edges of the viewport scrolls one row
+        i_slot = min(max(-1, i_slot), self.n_visible_row)
+        i = self.i_first + i_slot
+        if not 0 <= i < len(self.entries):
+            return -1
+        return i
+
+    def set_row_color(self, i, color):
+        self.i_highlight = i
+        self.highlight_color = color
+        for slot in self.slots:
+            if slot.i == i:
+                slot.num_widget.configure(background=color)
+
+    def move_row(self, i, j):
+        self.entries.insert(j, self.entries.pop(i))
+        if self.i_highlight == i:
+            self.i_highlight = j
+        self.see(j)
+        self.invalidate_slots()
+        self.notify_change()
+
+    def delete_slot(self, slot):
+        if slot.i is not None:
+            self.delete_param(slot.i)
+
+    def delete_param(self, i):
+        entry = self.entries[i][0]
+        self.entry_index.discard(entry)
+        self.selected_keys.discard(entry)
+        del self.entries[i]
+        self.i_highlight = -1
+        self.resize()
+        self.notify_change()
+
+    def get_items(self):
+        return self.entries
+
+    def get_item_key(self, item):
+        return item[0]
+
+    def get_item_value(self, item):
+        return list(item)
+
+    def get_item_label(self, item):
+        return item[1] if len(item) > 1 else ''
+
+    def set_items(self, items, deleted_items=()):
+        for entry_label in deleted_items:
+            self.entry_index.discard(entry_label[0])
+        self.entries = list(items)
+        self.i_highlight = -1
+        self.resize()
+        self.notify_change()
+
+    def clear_selection(self):
+        self.selected_keys = set()
+        self.i_anchor = -1
+        self.i_highlight = -1
+        self.invalidate_slots()
+
+    def get(self):
+        return [list(entry_label) for entry_label in self.entries]
 
 
 class HyperlinkManager:
@@ -273,14 +1286,33 @@ class HyperlinkManager:
         self.reset()
 
     def reset(self):
-        self.links = {}
+        for tag in getattr(self, 'links', {}):
+            self.text.tag_delete(tag)
+        self.links = collections.OrderedDict()
+        self.n_link = 0
 
     def add_new_link(self, action):
         "Returns tag for link to use in tk.Text widget"
-        tag = "hyper-%d" % len(self.links)
+        # a counter, as pruned links leave gaps in links
+        tag = "hyper-%d" % self.n_link
+        self.n_link += 1
         self.links[tag] = action
         return "hyper", tag
 
+    def prune(self, is_all=False):
+        """
+        Drops the oldest links, up to the first one that is still in
+        the widget, for text deleted from the top of the widget. With
+        is_all, every link is checked, for text deleted elsewhere.
+        """
+        for tag in list(self.links):
+            if self.text.tag_ranges(tag):
+                if is_all:
+                    continue
+                break
+            self.text.tag_delete(tag)
+            del self.links[tag]
+
     def _enter(self, event):
         self.text.config(cursor="hand2")
 
@@ -301,6 +1333,9 @@ class LabeledEntry(tk.Frame):
     in a row. The button is used to load a filename or directory.
     """
 
+    # the entry is a StringVar, which notifies every change
+    is_change_tracked = True
+
     def __init__(
             self,
             parent,
@@ -343,23 +1378,150 @@ class LabeledEntry(tk.Frame):
         self.entry.grid(column=i_column, row=0)
 
     def load_file(self):
+        import tkFileDialog
         fname = tkFileDialog.askopenfilename()
         self.stringvar.set(fname)
 
     def load_dir(self):
+        import tkFileDialog
         fname = tkFileDialog.askdirectory()
         self.stringvar.set(fname)
 
+    def add_change_callback(self, callback):
+        self.stringvar.trace('w', lambda *args: callback())
+
     def get(self):
         return self.stringvar.get()
 
 
-def fix_list(tcl_list):
+class ListLoader(tk.Frame):
+
+    """
+    A load button for a list of files, that adds the files to the
+    list in chunks of `chunk_size` every `interval` ms, so that the
+    form stays responsive while thousands of files are added. Files
+    already in a list with `is_unique` are skipped. While loading, a
+    count of the files added and a cancel button are shown next to
+    the button.
+
+    Files come from `add_fnames`, or from `scan`, which searches a
+    directory with a DirScanner, filtered by include and exclude.
+
+    If `is_tools`, buttons to sort the list, and to move or delete the
+    selected rows, are also shown.
+    """
+
+    def __init__(
+            self, parent, file_list, text, command, is_label=True,
+            include=None, exclude=None, is_tools=False):
+        tk.Frame.__init__(self, parent)
+        self.file_list = file_list
+        self.is_label = is_label
+        self.include = include
+        self.exclude = exclude
+        self.interval = 30
+        self.chunk_size = 1000
+        self.pending_fnames = collections.deque()
+        self.scanner = None
+        self.n_added = 0
+        self.n_total = 0
+        self.load_id = None
+
+        self.button = tk.Button(self, text=text, command=command)
+        self.button.grid(column=0, row=0)
+        self.i_column = 1
+        if is_tools:
+            tools = [
+                ('sort', self.file_list.sort),
+                ('to top', lambda: self.file_list.move_selected(True)),
+                ('to bottom', lambda: self.file_list.move_selected(False)),
+                ('delete', self.file_list.delete_selected)]
+            for tool_text, tool_fn in tools:
+                button = tk.Button(self, text=tool_text, command=tool_fn)
+                button.grid(column=self.i_column, row=0)
+                self.i_column += 1
+        self.label = tk.Label(self, fg='#666666')
+        self.label.grid(column=self.i_column, row=0)
+        self.cancel_button = tk.Button(
+            self, text='cancel', command=self.cancel)
+
+    def start_loading(self):
+        if self.load_id is None:
+            self.n_added = 0
+            self.n_total = 0
+            self.cancel_button.grid(column=self.i_column + 1, row=0)
+            self.load_id = self.after(self.interval, self.load_chunk)
+
+    def add_fnames(self, fnames):
+        self.start_loading()
+        self.pending_fnames.extend(fnames)
+        self.n_total += len(fnames)
+
+    def scan(self, root):
+        "Adds the files under root, stopping any scan that is running."
+        self.start_loading()
+        if self.scanner is not None:
+            self.scanner.cancel()
+        self.scanner = DirScanner(root, self.include, self.exclude)
+        self.scanner.start()
+
+    def load_chunk(self):
+        self.load_id = None
+        fnames = []
+        while self.pending_fnames and len(fnames) < self.chunk_size:
+            fnames.append(self.pending_fnames.popleft())
+        if self.scanner is not None:
+            scanned_fnames = self.scanner.get_fnames(
+                self.chunk_size - len(fnames))
+            self.n_total += len(scanned_fnames)
+            fnames.extend(scanned_fnames)
+            if self.scanner.is_done and not self.scanner.chunks.qsize():
+                self.scanner = None
+
+        if self.is_label:
+            entry_labels = [
+                (fname, os.path.basename(fname)) for fname in fnames]
+        else:
+            entry_labels = [(fname, None) for fname in fnames]
+        if entry_labels:
+            self.n_added += self.file_list.add_entries(entry_labels)
+
+        if self.pending_fnames or self.scanner is not None:
+            if self.scanner is not None:
+                text = 'scanning %s: %d files added' % (
+                    self.scanner.root, self.n_added)
+            else:
+                text = 'adding files: %d of %d' % (
+                    self.n_added, self.n_total)
+            self.label.configure(text=text)
+            self.load_id = self.after(self.interval, self.load_chunk)
+        else:
+            self.finish_loading('%d files added' % self.n_added)
+
+    def finish_loading(self, text):
+        if self.load_id is not None:
+            self.after_cancel(self.load_id)
+            self.load_id = None
+        self.pending_fnames.clear()
+        if self.scanner is not None:
+            self.scanner.cancel()
+            self.scanner = None
+        self.label.configure(text=text)
+        self.cancel_button.grid_forget()
+
+    def cancel(self):
+        self.finish_loading('cancelled after %d files' % self.n_added)
+
+
+def fix_list(tcl_list, widget=None):
     """
-    fix for Windows where askopenfilenames fails to format the list
+    fix for Windows where askopenfilenames fails to format the list.
+    If a widget is given, the list is split by Tcl.
     """
     if isinstance(tcl_list, list) or isinstance(tcl_list, tuple):
         return tcl_list
+    if widget is not None:
+        return widget.tk.splitlist(tcl_list)
     regex = r"""
     {.*?}   # text found in brackets
     | \S+   # or any non-white-space characters
@@ -374,14 +1536,17 @@ def askopenfilenames(*args, **kwargs):
     Wrap the askopenfilenames dialog to fix the fname list return
     for Windows, which returns a formatted string, not a list.
     """
+    import tkFileDialog
     fnames = tkFileDialog.askopenfilenames(*args, **kwargs)
-    return fix_list(fnames)
+    return fix_list(fnames, kwargs.get('parent'))
 
 
 def exit():
     """
     Convenience function to close Tkinter.
     """
+    if is_headless():
+        return
     tk.Tk().quit()
 
 
@@ -391,6 +1556,7 @@ class ReadOnlyText(tk.Text):
         kwargs['insertwidth'] = 0
         kwargs['highlightthickness'] = 0
         tk.Text.__init__(self, *args, **kwargs)
+        from idlelib.WidgetRedirector import WidgetRedirector
         self.redirector = WidgetRedirector(self)
         self.insert = \
             self.redirector.register("insert", lambda *args, **kw: "break")
@@ -398,6 +1564,258 @@ class ReadOnlyText(tk.Text):
             self.redirector.register("delete", lambda *args, **kw: "break")
 
 
+class Job(object):
+
+    """
+    Book-keeping for one execution of `Form.run` on a worker thread.
+    A sweep is a Job whose children are the runs of each combination
+    of params, with their output sent to the output_group of the
+    combination.
+    """
+
+    def __init__(self, params, output_group=None):
+        self.params = params
+        self.thread = None
+        self.is_cancelled = False
+        self.is_failed = False
+        self.output_group = output_group
+        self.children = []
+        self.n_done = 0
+
+        # for the jobs in the job table of a Form
+        self.i_job = None
+        self.state = 'queued'
+        self.start_time = None
+        self.end_time = None
+        self.output = None
+        self.output_fname = None
+
+    def get_duration(self):
+        if self.start_time is None:
+            return 0.0
+        if self.end_time is None:
+            return time.time() - self.start_time
+        return self.end_time - self.start_time
+
+    def cancel(self):
+        self.is_cancelled = True
+        for child in self.children:
+            child.is_cancelled = True
+
+
+def copy_value(value):
+    "Copies the nested lists in the value of a param."
+    if isinstance(value, list):
+        return [copy_value(v) for v in value]
+    return value
+
+
+class DefaultParam(object):
+
+    """
+    Stands in for the entry of a param of a Form, until the widgets
+    of the param are built.
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+def get_param_fnames(value):
+    """
+    Returns the strings in a param value that are paths of files.
+    Directories are left out, as the files in them are not checked.
+    """
+    if isinstance(value, basestring):
+        if os.path.isfile(value):
+            return [value]
+        return []
+    if isinstance(value, (list, tuple)):
+        fnames = []
+        for sub_value in value:
+            fnames.extend(get_param_fnames(sub_value))
+        return fnames
+    return []
+
+
+class ResultCache(object):
+
+    """
+    A cache on disk of the output of runs of a Form, keyed by the
+    params and by the size and modification time of the files named
+    in the params. Once there are more than max_results results, the
+    least recently used ones are deleted.
+    """
+
+    def __init__(self, cache_dir, namespace='', max_results=100):
+        self.cache_dir = cache_dir
+        self.namespace = namespace
+        self.max_results = max_results
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def get_key(self, params):
+        hasher = hashlib.sha1()
+        hasher.update(self.namespace)
+        hasher.update(json.dumps(params, sort_keys=True))
+        for fname in sorted(set(get_param_fnames(params.values()))):
+            stat = os.stat(fname)
+            hasher.update('%r %r %r' % (fname, stat.st_size, stat.st_mtime))
+        return hasher.hexdigest()
+
+    def get_fname(self, key):
+        return os.path.join(self.cache_dir, key + '.pickle')
+
+    def get(self, key):
+        "Returns the cached output segments, or None."
+        fname = self.get_fname(key)
+        try:
+            with open(fname, 'rb') as f:
+                segments = pickle.load(f)
+        except Exception:
+            return None
+        # the modification time orders the results for eviction
+        os.utime(fname, None)
+        return segments
+
+    def put(self, key, segments):
+        """
+        Stores a list of (out_str, cmd_fn[, tag]) output segments. Returns
+        False if a cmd_fn can't be pickled, e.g. a lambda.
+        """
+        try:
+            data = pickle.dumps(segments, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return False
+        fname = self.get_fname(key)
+        tmp_fname = fname + '.tmp'
+        with open(tmp_fname, 'wb') as f:
+            f.write(data)
+        os.rename(tmp_fname, fname)
+        self.evict()
+        return True
+
+    def evict(self):
+        fnames = glob.glob(os.path.join(self.cache_dir, '*.pickle'))
+        n_extra = len(fnames) - self.max_results
+        if n_extra <= 0:
+            return
+        fnames.sort(key=os.path.getmtime)
+        for fname in fnames[:n_extra]:
+            os.remove(fname)
+
+
+class PipeWriter(object):
+
+    """
+    File-like object that sends written text through a pipe
+    connection, used as stdout in the child process of a Form.
+    Text is sent in complete lines, as the output area ends each
+    message with a newline. A partial line is sent on `flush`, or
+    once it is longer than max_partial.
+    """
+
+    def __init__(self, conn, max_partial=65536):
+        self.conn = conn
+        self.partial = ''
+        self.max_partial = max_partial
+
+    def write(self, out_str):
+        out_str = self.partial + out_str
+        i = out_str.rfind('\n') + 1
+        if i == 0 and len(out_str) >= self.max_partial:
+            i = len(out_str)
+        self.partial = out_str[i:]
+        if i:
+            self.conn.send(('output', out_str[:i]))
+
+    def flush(self):
+        if self.partial:
+            self.conn.send(('output', self.partial))
+            self.partial = ''
+
+    def print_output(self, out_str):
+        """
+        The print_output given to fn in the child: like print_output
+        in a thread, out_str is sent at once as its own message.
+        """
+        self.flush()
+        self.conn.send(('output', out_str))
+
+
+def run_in_process(fn, params, conn):
+    """
+    Entry point of the child process started by `Form.run_process`.
+    Output from fn(params, print_output), and from print statements,
+    is sent back through conn, followed by any traceback.
+    """
+    writer = PipeWriter(conn)
+    sys.stdout = writer
+    try:
+        fn(params, writer.print_output)
+    except:
+        writer.flush()
+        conn.send(('exception', traceback.format_exc()))
+    writer.flush()
+    conn.send(('done', None))
+    conn.close()
+
+
+def count_lines(start, end):
+    """
+    Returns the number of lines from the Text index start to end, where
+    both are at the start of a line, such as the ranges of group tags.
+    """
+    return int(str(end).split('.')[0]) - int(str(start).split('.')[0])
+
+
+def put_until_stopped(chunks, item, stop_event):
+    "Puts item in the bounded queue chunks, unless stop_event is set."
+    while not stop_event.is_set():
+        try:
+            chunks.put(item, timeout=0.1)
+            return
+        except Queue.Full:
+            pass
+
+
+def read_pipe(pipe, tag, chunks, stop_event, chunk_size=65536):
+    """
+    Executed on a reader thread of `Form.run_command`: puts the output
+    of pipe in chunks, as (tag, text) items of whole lines, where
+    possible, of up to about chunk_size bytes, and then None. The text
+    is decoded from UTF-8 incrementally, so a character split between
+    two items is kept whole.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    fd = pipe.fileno()
+    partial = ''
+    while not stop_event.is_set():
+        data = os.read(fd, chunk_size)
+        if not data:
+            break
+        data = partial + data
+        i = data.rfind('\n') + 1
+        if i == 0:
+            if len(data) < chunk_size:
+                partial = data
+                continue
+            # a very long line is split
+            i = len(data)
+        partial = data[i:]
+        text = decoder.decode(data[:i])
+        if text:
+            put_until_stopped(chunks, (tag, text), stop_event)
+    text = decoder.decode(partial, True)
+    if text:
+        put_until_stopped(chunks, (tag, text), stop_event)
+    put_until_stopped(chunks, None, stop_event)
+    pipe.close()
+
+
 class Form(tk.Tk):
 
     """
@@ -423,10 +1841,44 @@ class Form(tk.Tk):
 
     Creates a hyperlinkManager instance to allow links to appear in the form.
 
-    Keeps track of child mouse_widgets to send mouse events.
+    Keeps track of child mouse_widgets to send mouse events. Their
+    bounding boxes are cached until the form is scrolled or resized,
+    and the widget that receives a mouse press captures the subsequent
+    drag and release events.
 
     Creates an (optional) text output area to pipe messages from the running
     of the script.
+
+    Set `is_threaded` to True to execute `run` on a worker thread, so that
+    the form stays responsive. Calls to `print_output`, `clear_output` and
+    `print_exception` from the worker are queued and drained on the Tk
+    thread every `poll_interval` ms. While the job runs, the submit button
+    turns into a cancel button, and `run` can poll `is_cancelled`.
+
+    `start_live` turns on live mode, where the form is submitted
+    automatically shortly after the params are changed.
+
+    `enable_result_cache` turns on a cache on disk of the output of
+    `run`, so that submitting the same params again replays the output.
+
+    Params pushed by push_radio_param, push_checkbox_param or the
+    list params can be marked with `add_sweep_param`, and `sweep`
+    then runs the form for every combination of their values, in
+    parallel on `sweep_workers` threads.
+
+    `push_job_table` turns on a job queue: each submit queues a job,
+    up to max_running jobs run at once, and a table lists the jobs
+    with links to show or cancel them.
+
+    For very tall forms, set `is_lazy` to True before pushing rows.
+    The widgets of each row are then only built when the row scrolls
+    near the visible area, and params return their default values
+    until then.
+
+    For CPU-bound jobs, set `process_fn` to a module-level function
+    fn(params, print_output). On submit, it is executed in a child
+    process instead of `run`, and its output and tracebacks are
+    streamed back to the output area.
     """
 
     def __init__(self, title='', width=700, height=800, parent=None):
@@ -452,13 +1904,84 @@ class Form(tk.Tk):
         self.interior.configure(bd=30)
         self.i_row_interior = 0
 
+        self.is_lazy = False
+        self.lazy_rows = collections.deque()
+        self.lazy_spacer = None
+        self.lazy_id = None
+        self.lazy_row_height = 30
+        self.lazy_margin = 200
+        self.lazy_chunk = 20
+        self.is_building_rows = False
+        self.vscroll_frame.scroll_callbacks.append(self.schedule_lazy_rows)
+
         self.output = None
-        self.output_lines = []
+        self.is_output_pushed = False
+        self.output_lines = collections.deque()
         self.output_link_manager = None
+        self.output_max_lines = None
+        # max_lines of push_output, and the caps of running commands
+        self.output_base_max_lines = None
+        self.output_limits = []
+        self.output_height = None
+        self.output_flush_interval = None
+        self.output_buffer = []
+        self.output_flush_id = None
+        self.output_flush_time = 0
 
         self.param_entries = collections.OrderedDict()
+        self.watched_params = {}
+        self.param_cache = {}
+        self.param_subscribers = []
+
+        self.is_threaded = False
+        self.process_fn = None
+        self.poll_interval = 16
+        self.poll_budget = 8
+        self.is_draining_queue = False
+        self.job = None
+        # cancelled jobs whose worker threads are still running
+        self.dropped_jobs = []
+        self.submit_button = None
+        self.gui_thread_id = thread.get_ident()
+        # made by init_workers before the first worker thread starts
+        self.gui_queue = None
+        self.worker = None
+        self.is_polling = False
+        self.gui_job = None
+
+        self.sweep_params = []
+        self.param_choices = {}
+        self.sweep_workers = None
+        self.collapsed_output_groups = set()
+
+        self.is_job_queue = False
+        self.job_table = None
+        self.job_link_manager = None
+        self.jobs = []
+        self.running_jobs = []
+        self.shown_job = None
+        self.max_running_jobs = 1
+        self.max_job_outputs = 10
+        self.max_jobs = 100
+        self.n_queued_job = 0
+        self.job_table_id = None
+        self.job_spill_dir = None
+
+        self.is_live = False
+        self.live_delay = 300
+        self.live_id = None
+        self.is_live_pending = False
+
+        self.result_cache = None
+        self.captured_output = None
+        self.capture_key = None
 
         self.mouse_widgets = []
+        self.mouse_widget_bboxes = None
+        self.drag_widget = None
+        self.vscroll_frame.scroll_callbacks.append(
+            self.invalidate_mouse_widgets)
+        self.bind('<Configure>', self.invalidate_mouse_widgets, '+')
         self.bind('<Button-1>', self.mouse_down)
         self.bind('<B1-Motion>', self.mouse_drag)
         self.bind('<ButtonRelease-1>', self.mouse_up)
@@ -468,178 +1991,1438 @@ class Form(tk.Tk):
         self.call('wm', 'attributes', '.', '-topmost', True)
         self.after_idle(self.call, 'wm', 'attributes', '.', '-topmost', False)
 
+    def invalidate_mouse_widgets(self, *args):
+        self.mouse_widget_bboxes = None
+
+    def get_mouse_widget(self, event):
+        "Returns the top-most mouse widget under the event, or None."
+        if self.mouse_widget_bboxes is None:
+            self.mouse_widget_bboxes = []
+            for widget in reversed(self.mouse_widgets):
+                x0 = widget.winfo_rootx()
+                y0 = widget.winfo_rooty()
+                x1 = widget.winfo_width() + x0
+                y1 = widget.winfo_height() + y0
+                self.mouse_widget_bboxes.append((x0, y0, x1, y1, widget))
+        x, y = event.x_root, event.y_root
+        for x0, y0, x1, y1, widget in self.mouse_widget_bboxes:
+            if y0 <= y <= y1 and x0 <= x <= x1:
+                return widget
+        return None
+
     def mouse_down(self, event):
-        for widget in reversed(self.mouse_widgets):
-            if widget.contains_event(event):
-                widget.mouse_down(event)
+        self.drag_widget = self.get_mouse_widget(event)
+        if self.drag_widget is not None:
+            self.drag_widget.mouse_down(event)
 
     def mouse_up(self, event):
-        for widget in reversed(self.mouse_widgets):
-            if widget.contains_event(event):
-                widget.mouse_up(event)
+        if self.drag_widget is not None:
+            self.drag_widget.mouse_up(event)
+            self.drag_widget = None
 
     def mouse_drag(self, event):
-        for widget in reversed(self.mouse_widgets):
-            if widget.contains_event(event):
-                widget.mouse_drag(event)
+        if self.drag_widget is not None:
+            self.drag_widget.mouse_drag(event)
+
+    def defer_row(self, build_fn, param_id=None, default=None):
+        """
+        Calls build_fn to build widgets on the form. If `is_lazy`, this
+        is deferred until the widgets scroll near the visible area, and
+        until then, the param param_id returns default.
+        """
+        if not self.is_lazy and not self.lazy_rows:
+            build_fn()
+            return
+        if param_id is not None:
+            self.param_entries[param_id] = DefaultParam(default)
+        if self.lazy_spacer is None:
+            self.lazy_spacer = tk.Frame(self.interior, width=1)
+        self.lazy_rows.append(build_fn)
+        self.schedule_lazy_rows()
+
+    def schedule_lazy_rows(self):
+        if self.lazy_rows and self.lazy_id is None:
+            self.lazy_id = self.after_idle(self.build_visible_rows)
+
+    def build_visible_rows(self):
+        "Builds deferred rows until they fill the visible area."
+        self.lazy_id = None
+        canvas = self.vscroll_frame.canvas
+        view_bottom = canvas.canvasy(canvas.winfo_height())
+        while self.lazy_rows:
+            self.update_lazy_spacer()
+            self.interior.update_idletasks()
+            if self.lazy_spacer.winfo_y() > view_bottom + self.lazy_margin:
+                break
+            self.build_rows(self.lazy_chunk)
+        self.update_lazy_spacer()
+
+    def build_rows(self, n_row=None):
+        "Builds the next n_row deferred rows, or all if n_row is None."
+        self.is_building_rows = True
+        try:
+            i_row = 0
+            while self.lazy_rows and (n_row is None or i_row < n_row):
+                build_fn = self.lazy_rows.popleft()
+                build_fn()
+                i_row += 1
+        finally:
+            self.is_building_rows = False
+        if self.param_subscribers:
+            self.watch_params()
+
+    def build_all_rows(self):
+        self.build_rows()
+        self.update_lazy_spacer()
+
+    def update_lazy_spacer(self):
+        # the spacer holds the place of the deferred rows
+        if self.lazy_spacer is None:
+            return
+        if self.lazy_rows:
+            self.lazy_spacer.configure(
+                height=len(self.lazy_rows)*self.lazy_row_height)
+            self.lazy_spacer.grid(row=self.i_row_interior + 1, column=0)
+        else:
+            self.lazy_spacer.grid_forget()
 
     def push_row(self, widget):
+        if self.lazy_rows and not self.is_building_rows:
+            # keep the order of rows pushed after deferred rows
+            self.lazy_rows.append(lambda: self.push_row(widget))
+            return
         self.i_row_interior += 1
         widget.grid(row=self.i_row_interior, column=0, sticky=tk.W)
 
     def push_text(self, text, fontsize=12):
-        label = tk.Label(
-            self.interior, font=('defaultFont', fontsize), text=text)
-        self.push_row(label)
+        def build():
+            label = tk.Label(
+                self.interior, font=('defaultFont', fontsize), text=text)
+            self.push_row(label)
+        self.defer_row(build)
 
     def push_spacer(self, height=1):
-        label = tk.Label(self.interior, height=height)
-        self.push_row(label)
+        def build():
+            label = tk.Label(self.interior, height=height)
+            self.push_row(label)
+        self.defer_row(build)
 
     def push_line(self, width=500, height=1, color="#999999"):
-        canvas = tk.Canvas(self.interior, width=width, height=height, bg=color)
-        self.push_row(canvas)
+        def build():
+            canvas = tk.Canvas(
+                self.interior, width=width, height=height, bg=color)
+            self.push_row(canvas)
+        self.defer_row(build)
 
     def push_button(self, text, command_fn):
-        button = tk.Button(self.interior, text=text, command=command_fn)
-        self.push_row(button)
+        "Returns the button, or None if it is deferred by `is_lazy`."
+        buttons = []
+
+        def build():
+            button = tk.Button(self.interior, text=text, command=command_fn)
+            self.push_row(button)
+            buttons.append(button)
+        self.defer_row(build)
+
+        if buttons:
+            return buttons[0]
+        return None
 
     def push_labeled_param(
             self, param_id, text, entry_text='',
             load_file_text=None, load_dir_text=None,
             width=None):
-        entry = LabeledEntry(
-            self.interior, text, entry_text, load_file_text=load_file_text,
-            load_dir_text=load_dir_text, width=width)
-        self.push_row(entry)
-        self.param_entries[param_id] = entry
+        def build():
+            entry = LabeledEntry(
+                self.interior, text, entry_text,
+                load_file_text=load_file_text,
+                load_dir_text=load_dir_text, width=width)
+            self.push_row(entry)
+            self.param_entries[param_id] = entry
+        self.defer_row(build, param_id, entry_text)
+
+    def make_list(self, is_virtual, metadata=None):
+        if is_virtual:
+            if metadata:
+                raise ValueError('metadata is not shown in virtual lists')
+            file_list = VirtualReorderableList(self.interior)
+        else:
+            file_list = ReorderableList(self.interior, metadata=metadata)
+        # the rows have no other widgets, so every change is notified
+        file_list.is_change_tracked = True
+        return file_list
 
     def push_file_list_param(
-            self, param_id, load_file_text, is_label=True):
-        file_list = ReorderableList(self.interior)
+            self, param_id, load_file_text, is_label=True, is_virtual=False,
+            metadata=None, is_tools=False):
+        def build():
+            file_list = self.make_list(is_virtual, metadata)
 
-        def load_file():
-            fnames = askopenfilenames(title=load_file_text)
-            for fname in fnames:
-                if is_label:
-                    label = os.path.basename(fname)
-                else:
-                    label = None
-                file_list.add_entry_label(fname, label)
+            def load_file():
+                fnames = askopenfilenames(title=load_file_text, parent=self)
+                loader.add_fnames(fnames)
 
-        load_files_button = tk.Button(
-            self.interior, text=load_file_text, command=load_file)
-        self.push_row(load_files_button)
+            loader = ListLoader(
+                self.interior, file_list, load_file_text, load_file,
+                is_label, is_tools=is_tools)
+            self.push_row(loader)
 
-        self.push_row(file_list)
-        self.mouse_widgets.append(file_list)
-        self.param_entries[param_id] = file_list
+            self.push_row(file_list)
+            self.mouse_widgets.append(file_list)
+            self.param_entries[param_id] = file_list
+        self.defer_row(build, param_id, [])
 
     def push_dir_list_param(
-            self, param_id, load_dir_text, is_label=True):
-        file_list = ReorderableList(self.interior)
-
-        def load_dir():
-            the_dir = tkFileDialog.askdirectory(title=load_dir_text)
-            if is_label:
-                label = os.path.basename(the_dir)
-            else:
-                label = None
-            file_list.add_entry_label(the_dir, label)
+            self, param_id, load_dir_text, is_label=True, is_virtual=False,
+            metadata=None, is_expand=False, include=None, exclude=None,
+            is_tools=False):
+        def build():
+            file_list = self.make_list(is_virtual, metadata)
+
+            def load_dir():
+                import tkFileDialog
+                the_dir = tkFileDialog.askdirectory(title=load_dir_text)
+                if is_expand:
+                    if the_dir:
+                        loader.scan(the_dir)
+                    return
+                if is_label:
+                    label = os.path.basename(the_dir)
+                else:
+                    label = None
+                file_list.add_entry_label(the_dir, label)
 
-        load_dir_button = tk.Button(
-            self.interior, text=load_dir_text, command=load_dir)
-        self.push_row(load_dir_button)
+            loader = ListLoader(
+                self.interior, file_list, load_dir_text, load_dir,
+                is_label, include, exclude, is_tools)
+            self.push_row(loader)
 
-        self.push_row(file_list)
-        self.mouse_widgets.append(file_list)
-        self.param_entries[param_id] = file_list
+            self.push_row(file_list)
+            self.mouse_widgets.append(file_list)
+            self.param_entries[param_id] = file_list
+        self.defer_row(build, param_id, [])
 
     def push_checkbox_param(self, param_id, text, init_val='1'):
-        int_var = tk.IntVar()
-        int_var.set(init_val)
-        check_button = tk.Checkbutton(
-            self.interior, text=text, variable=int_var)
-        self.push_row(check_button)
-        self.param_entries[param_id] = int_var
+        def build():
+            int_var = tk.IntVar()
+            int_var.set(init_val)
+            check_button = tk.Checkbutton(
+                self.interior, text=text, variable=int_var)
+            self.push_row(check_button)
+            self.param_entries[param_id] = int_var
+        self.param_choices[param_id] = [0, 1]
+        self.defer_row(build, param_id, int(init_val))
 
     def push_radio_param(self, param_id, text_list, init_val=0):
-        int_var = tk.IntVar()
-        buttons = []
-        for i, text in enumerate(text_list):
-            val = i
-            button = tk.Radiobutton(
-                self.interior, text=text, value=val, variable=int_var)
-            buttons.append(button)
-        int_var.set(str(init_val))
-        for button in buttons:
-            self.push_row(button)
-        self.param_entries[param_id] = int_var
+        def build():
+            int_var = tk.IntVar()
+            buttons = []
+            for i, text in enumerate(text_list):
+                val = i
+                button = tk.Radiobutton(
+                    self.interior, text=text, value=val, variable=int_var)
+                buttons.append(button)
+            int_var.set(str(init_val))
+            for button in buttons:
+                self.push_row(button)
+            self.param_entries[param_id] = int_var
+        self.param_choices[param_id] = range(len(text_list))
+        self.defer_row(build, param_id, int(init_val))
+
+    def watch_params(self):
+        """
+        Registers change callbacks on new entries in param_entries.
+        Entries that are tk Variables, or that have an
+        `add_change_callback` method and set `is_change_tracked`, are
+        tracked and their values cached, other entries are read on
+        every `get_params`.
+        """
+        for param_id, entry in self.param_entries.items():
+            if param_id in self.watched_params:
+                if self.watched_params[param_id][0] is entry:
+                    continue
+            callback = self.get_param_change_callback(param_id)
+            if isinstance(entry, tk.Variable):
+                entry.trace('w', callback)
+                is_tracked = True
+            elif hasattr(entry, 'add_change_callback'):
+                entry.add_change_callback(callback)
+                is_tracked = getattr(entry, 'is_change_tracked', False)
+            else:
+                is_tracked = isinstance(entry, DefaultParam)
+            self.watched_params[param_id] = (entry, is_tracked)
+            self.param_cache.pop(param_id, None)
+
+    def get_param_change_callback(self, param_id):
+        return lambda *args: self.on_param_change(param_id)
+
+    def on_param_change(self, param_id):
+        self.param_cache.pop(param_id, None)
+        subscribers = [
+            fn for subscribed_id, fn in self.param_subscribers
+            if subscribed_id is None or subscribed_id == param_id]
+        if subscribers:
+            value = self.get_param(param_id)
+            for fn in subscribers:
+                fn(param_id, value)
+
+    def get_param(self, param_id):
+        if param_id in self.param_cache:
+            return copy_value(self.param_cache[param_id])
+        entry, is_tracked = self.watched_params[param_id]
+        value = entry.get()
+        if is_tracked:
+            self.param_cache[param_id] = copy_value(value)
+        return value
 
     def get_params(self):
+        """
+        Returns the current values of the params. Values of tracked
+        entries are cached until the entries change.
+        """
+        self.watch_params()
         params = collections.OrderedDict()
-        for param_id, entry in self.param_entries.items():
-            params[param_id] = entry.get()
+        for param_id in self.param_entries:
+            params[param_id] = self.get_param(param_id)
         return params
 
-    def push_output(self, width=70):
-        if self.output is not None:
+    def subscribe_param(self, fn, param_id=None):
+        """
+        Calls fn(param_id, value) whenever the param param_id changes,
+        or whenever any param changes if param_id is None.
+        """
+        self.watch_params()
+        self.param_subscribers.append((param_id, fn))
+
+    def unsubscribe_param(self, fn):
+        self.param_subscribers = [
+            (param_id, subscribed_fn)
+            for param_id, subscribed_fn in self.param_subscribers
+            if subscribed_fn is not fn]
+
+    def push_output(
+            self, width=70, flush_interval=None, max_lines=None, height=None):
+        """
+        Pushes the output area. If flush_interval (ms) is given, printed
+        output is buffered and sent to the widget at most once per
+        interval, otherwise every `print_output` is shown immediately.
+
+        If max_lines is given, only the last max_lines lines of output
+        are kept. If height (in lines) is given, the output area has a
+        fixed height with its own scrollbar, instead of growing with
+        the output.
+        """
+        if self.is_output_pushed:
             raise Error('Error: push_output has been called more than once!')
+        self.is_output_pushed = True
         self.output_width = width
-        self.output = ReadOnlyText(self.interior, width=self.output_width)
-        self.push_row(self.output)
-        self.output_link_manager = HyperlinkManager(self.output)
+        self.output_flush_interval = flush_interval
+        self.output_max_lines = max_lines
+        self.output_base_max_lines = max_lines
+        self.output_lines = collections.deque(maxlen=max_lines)
+        self.output_height = height
+
+        def build():
+            if height is None:
+                self.output = ReadOnlyText(
+                    self.interior, width=self.output_width)
+                self.push_row(self.output)
+            else:
+                frame = tk.Frame(self.interior)
+                scrollbar = tk.Scrollbar(frame, orient=tk.VERTICAL)
+                scrollbar.pack(fill=tk.Y, side=tk.RIGHT)
+                self.output = ReadOnlyText(
+                    frame, width=self.output_width, height=height,
+                    yscrollcommand=scrollbar.set)
+                self.output.pack(side=tk.LEFT, fill=tk.BOTH, expand=tk.TRUE)
+                scrollbar.config(command=self.output.yview)
+                self.push_row(frame)
+            self.output_link_manager = HyperlinkManager(self.output)
+            self.output.tag_configure('stderr', foreground='#CC0000')
+        self.defer_row(build)
 
     def clear_output(self):
+        if not self.is_gui_thread():
+            self.call_in_gui(self.clear_output)
+            return
+        job = self.gui_job
+        if job is not None and job.output_group is not None:
+            # the runs of a sweep share the output area
+            return
+        if job is not None and job.output is not None:
+            del job.output[:]
+            if job is not self.shown_job:
+                return
+        if self.output is None and self.is_output_pushed:
+            self.build_all_rows()
         if self.output is None:
             raise Exception("Output not initialized in Form")
+        self.output_buffer = []
+        if self.output_flush_id is not None:
+            self.after_cancel(self.output_flush_id)
+            self.output_flush_id = None
+        if self.captured_output is not None:
+            self.captured_output = []
         self.output.delete(1.0, tk.END)
-        self.output_str = []
-        self.update()
+        self.output_lines.clear()
+        self.output_link_manager.reset()
+        if not self.is_threaded:
+            self.update()
+
+    def print_output(self, out_str, cmd_fn=None, tag=None):
+        """
+        Prints out_str in the output area. If cmd_fn is given, out_str
+        is a link that calls cmd_fn. tag is a text tag for out_str,
+        such as 'stderr', which is shown in red.
+        """
+        if not self.is_gui_thread():
+            self.call_in_gui(self.print_output, out_str, cmd_fn, tag)
+            return
 
-    def print_output(self, out_str, cmd_fn=None):
-        # format to output width
-        new_lines = []
-        for line in out_str.splitlines():
-            n = self.output_width
-            sub_lines = [line[i:i+n] for i in range(0, len(line), n)]
-            if sub_lines:
-              sub_lines[-1] += "\n"
-            new_lines.extend(sub_lines)
+        job = self.gui_job
+        if job is not None and job.output_group is not None:
+            self.print_group_output(job.output_group, out_str, cmd_fn, tag)
+            return
+        if tag is None:
+            segment = (out_str, cmd_fn)
+        else:
+            segment = (out_str, cmd_fn, tag)
+        if job is not None and job.output is not None:
+            # a job in the job table keeps its own output
+            job.output.append(segment)
+            if job is not self.shown_job:
+                return
+
+        if self.captured_output is not None:
+            self.captured_output.append(segment)
+
+        new_lines = self.wrap_output(out_str)
         out_str = ''.join(new_lines)
 
+        if self.output is None and self.is_output_pushed:
+            self.build_all_rows()
         if self.output is None:
             raise Exception("Output not initialized in Form")
         if cmd_fn is not None:
             link_tag = self.output_link_manager.add_new_link(cmd_fn)
-            self.output.insert(tk.INSERT, out_str, link_tag)
         else:
-            self.output.insert(tk.INSERT, out_str)
-
+            link_tag = ()
+        if tag is not None:
+            link_tag += (tag,)
+        self.output_buffer.append((out_str, link_tag))
         self.output_lines.extend(new_lines)
-        self.output.configure(height=len(self.output_lines))
-        self.update()
+
+        interval = self.output_flush_interval
+        if interval is None:
+            if not self.is_draining_queue:
+                self.flush_output()
+        elif 1000*(time.time() - self.output_flush_time) >= interval:
+            self.flush_output()
+        elif self.output_flush_id is None:
+            self.output_flush_id = self.after(interval, self.flush_output)
+
+    def wrap_output(self, out_str):
+        """
+        Returns the lines of out_str, wrapped to the output width. Each
+        wrapped line ends in its own newline, so that the lines of the
+        widget match `output_lines` when sizing and trimming.
+        """
+        new_lines = []
+        for line in out_str.splitlines():
+            n = self.output_width
+            new_lines.extend(
+                line[i:i+n] + "\n" for i in range(0, len(line), n))
+        return new_lines
+
+    def flush_output(self):
+        """
+        Sends all buffered output, with link tags, to the output
+        widget in a single insert.
+        """
+        if not self.is_gui_thread():
+            self.call_in_gui(self.flush_output)
+            return
+        if self.output_flush_id is not None:
+            self.after_cancel(self.output_flush_id)
+            self.output_flush_id = None
+        self.output_flush_time = time.time()
+        if not self.output_buffer:
+            return
+        args = []
+        for out_str, link_tag in self.output_buffer:
+            args.extend([out_str, link_tag])
+        self.output_buffer = []
+        self.output.insert(tk.END, *args)
+        if self.output_max_lines is not None:
+            self.trim_output()
+        if self.output_height is None:
+            self.output.configure(height=len(self.output_lines))
+        else:
+            self.output.see(tk.END)
+        if not self.is_threaded:
+            self.update()
+
+    def limit_output(self, max_lines):
+        """
+        Keeps at most max_lines lines of output until the matching
+        `unlimit_output`, on top of the max_lines of `push_output`.
+        """
+        self.output_limits.append(max_lines)
+        self.update_output_limit()
+
+    def unlimit_output(self, max_lines):
+        self.output_limits.remove(max_lines)
+        self.update_output_limit()
+
+    def update_output_limit(self):
+        limits = [n for n in self.output_limits + [self.output_base_max_lines]
+                  if n is not None]
+        max_lines = min(limits) if limits else None
+        if max_lines != self.output_max_lines:
+            self.output_max_lines = max_lines
+            self.output_lines = collections.deque(
+                self.output_lines, maxlen=max_lines)
+
+    def trim_output(self):
+        "Deletes the oldest lines in the widget beyond output_max_lines."
+        n_line = int(self.output.index('end-1c').split('.')[0])
+        if self.output.get('end-2c') == '\n':
+            n_line -= 1
+        n_extra = n_line - self.output_max_lines
+        if n_extra > 0:
+            self.output.delete('1.0', '%d.0' % (n_extra + 1))
+            self.output_link_manager.prune()
 
     def run(self, params):
         "Dummy method to be overriden/replaced."
         pass
 
-    def print_exception(self):
-        if self.output is not None:
+    def print_exception(self, exc_str=None):
+        if exc_str is None:
+            exc_str = traceback.format_exc()
+        if not self.is_gui_thread():
+            job = self.get_worker_job()
+            if job is not None:
+                job.is_failed = True
+            self.call_in_gui(self.print_exception, exc_str)
+            return
+        # the output of a failed run is not cached
+        self.captured_output = None
+        if self.is_output_pushed:
             s = "\nTHERE WERE ERROR(S) IN PROCESSING THE PYTHON.\n"
             s += "Specific error described in the last line:\n\n"
-            s += traceback.format_exc()
+            s += exc_str
             s += "\n"
             self.print_output(s)
 
-    def submit(self):
-        if self.output is not None:
+    def is_gui_thread(self):
+        return thread.get_ident() == self.gui_thread_id
+
+    def init_workers(self):
+        "Makes the queue to the Tk thread and the state of workers."
+        if self.gui_queue is None:
+            self.gui_queue = Queue.Queue()
+            self.worker = threading.local()
+
+    def get_worker_job(self):
+        "Returns the Job of the calling worker thread, or None."
+        return getattr(self.worker, 'job', None)
+
+    def is_cancelled(self):
+        "Can be polled in `run` to stop a threaded job early."
+        job = self.get_worker_job()
+        return job is not None and job.is_cancelled
+
+    def call_in_gui(self, fn, *args):
+        """
+        Calls fn(*args) on the Tk thread. From a worker, the call is
+        queued for `poll_gui_queue`, and dropped if the job is cancelled.
+        """
+        if self.is_gui_thread():
+            fn(*args)
+        else:
+            self.gui_queue.put((self.get_worker_job(), fn, args))
+
+    def call_in_gui_always(self, fn, *args):
+        "Calls fn(*args) on the Tk thread, even if the job is cancelled."
+        if self.is_gui_thread():
+            fn(*args)
+        else:
+            self.gui_queue.put((None, fn, args))
+
+    def poll_gui_queue(self):
+        """
+        Calls the functions queued by workers for up to `poll_budget`
+        ms, so that the form keeps responding to a flood of output.
+        Output printed in a tick is drawn once, at the end of it.
+        """
+        deadline = time.time() + self.poll_budget/1000.0
+        is_backlog = False
+        self.is_draining_queue = True
+        try:
+            while True:
+                if time.time() > deadline:
+                    is_backlog = True
+                    break
+                try:
+                    job, fn, args = self.gui_queue.get_nowait()
+                except Queue.Empty:
+                    break
+                if job is None or not job.is_cancelled:
+                    # lets print_output find the output group of the job
+                    self.gui_job = job
+                    try:
+                        fn(*args)
+                    finally:
+                        self.gui_job = None
+        finally:
+            self.is_draining_queue = False
+            if self.output_buffer and self.output_flush_interval is None:
+                self.flush_output()
+            self.is_polling = (
+                is_backlog or self.job is not None
+                or bool(self.running_jobs) or bool(self.dropped_jobs))
+            if is_backlog:
+                # lets Tk handle its events before the next tick
+                self.after(1, self.poll_gui_queue)
+            elif self.is_polling:
+                self.after(self.poll_interval, self.poll_gui_queue)
+
+    def start_job(self, params):
+        self.init_workers()
+        self.drop_job()
+        self.job = Job(params)
+        self.job.thread = threading.Thread(
+            target=self.run_job, args=(self.job,))
+        self.job.thread.daemon = True
+        self.job.thread.start()
+        self.update_submit_button()
+        if not self.is_polling:
+            self.poll_gui_queue()
+
+    def run_job(self, job):
+        "Executed on the worker thread."
+        self.execute_job(job)
+        # not dropped if the job is cancelled, to tell that it is over
+        self.call_in_gui_always(self.finish_job, job)
+
+    def execute_job(self, job):
+        self.worker.job = job
+        try:
+            if self.process_fn is not None:
+                self.run_process(job.params)
+            else:
+                self.run(job.params)
+        except:
+            self.print_exception()
+
+    def run_process(self, params):
+        """
+        Executed on the worker thread: runs `process_fn` in a child
+        process and relays its messages until it is done or cancelled.
+        """
+        import multiprocessing
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(
+            target=run_in_process, args=(self.process_fn, params, sender))
+        process.daemon = True
+        process.start()
+        sender.close()
+        try:
+            while not self.is_cancelled():
+                if not receiver.poll(0.1):
+                    continue
+                try:
+                    kind, data = receiver.recv()
+                except EOFError:
+                    break
+                if kind == 'output':
+                    self.print_output(data)
+                elif kind == 'exception':
+                    self.print_exception(data)
+                else:
+                    break
+        finally:
+            if process.is_alive() and self.is_cancelled():
+                process.terminate()
+            process.join()
+            receiver.close()
+
+    def run_command(self, args, cwd=None, env=None, max_lines=10000):
+        """
+        Runs the command args in a subprocess, and streams its output
+        to the output area as it arrives, with stderr in the 'stderr'
+        tag. Returns the exit code, or None if the job is cancelled,
+        which kills the subprocess.
+
+        The output is read by two threads into a bounded queue, so a
+        command that writes faster than the form can show is paused.
+        While the command runs, only the last max_lines lines of
+        output are kept, unless max_lines is None.
+        """
+        self.init_workers()
+        if max_lines is not None:
+            self.call_in_gui_always(self.limit_output, max_lines)
+        try:
+            return self.stream_command(args, cwd, env)
+        finally:
+            if max_lines is not None:
+                self.call_in_gui_always(self.unlimit_output, max_lines)
+
+    def stream_command(self, args, cwd, env):
+        "Runs the command for `run_command` and returns its exit code."
+        process = subprocess.Popen(
+            args, cwd=cwd, env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        chunks = Queue.Queue(maxsize=64)
+        stop_event = threading.Event()
+        for pipe, tag in [(process.stdout, None), (process.stderr, 'stderr')]:
+            thread = threading.Thread(
+                target=read_pipe, args=(pipe, tag, chunks, stop_event))
+            thread.daemon = True
+            thread.start()
+
+        is_gui_thread = self.is_gui_thread()
+        n_open = 2
+        try:
+            while n_open > 0:
+                if self.is_cancelled():
+                    process.kill()
+                    process.wait()
+                    return None
+                if is_gui_thread:
+                    # keeps a form that isn't threaded responsive
+                    self.update()
+                try:
+                    item = chunks.get(timeout=0.05)
+                except Queue.Empty:
+                    continue
+                if item is None:
+                    n_open -= 1
+                    continue
+                tag, text = item
+                self.print_output(text, None, tag)
+                # lets the Tk thread catch up with the output
+                while (not is_gui_thread and not self.is_cancelled()
+                        and self.gui_queue.qsize() > 100):
+                    time.sleep(self.poll_interval/1000.0)
+        finally:
+            stop_event.set()
+        returncode = process.wait()
+        self.print_output(
+            '\nExited with code %d.\n' % returncode, None,
+            'stderr' if returncode else None)
+        return returncode
+
+    def finish_job(self, job):
+        if job in self.dropped_jobs:
+            self.dropped_jobs.remove(job)
+            if self.is_live_pending and not self.dropped_jobs:
+                self.live_submit()
+        elif job in self.running_jobs:
+            self.finish_queued_job(job)
+        elif job is self.job:
+            self.job = None
+            self.update_submit_button()
+            self.store_result()
+            if self.is_output_pushed:
+                self.flush_output()
+
+    def drop_job(self):
+        "Cancels the current job, dropping its remaining output."
+        if self.job is None:
+            return
+        self.job.cancel()
+        if self.job.thread is not None and self.job.thread.is_alive():
+            # kept until the worker returns, see `live_submit`
+            self.dropped_jobs.append(self.job)
+        self.job = None
+        self.update_submit_button()
+
+    def cancel_job(self):
+        if self.job is None:
+            return
+        self.drop_job()
+        self.captured_output = None
+        if self.is_output_pushed:
+            self.print_output('\nCancelled.\n')
+
+    def update_submit_button(self):
+        if self.submit_button is None:
+            return
+        if self.job is None:
+            self.submit_button.configure(text='submit', command=self.submit)
+        else:
+            self.submit_button.configure(
+                text='cancel', command=self.cancel_job)
+
+    def enable_result_cache(
+            self, cache_dir=None, max_results=100, namespace=None):
+        """
+        Caches the output of `run` on disk in cache_dir, keeping the
+        max_results most recently used results. The namespace, by
+        default the path of the file of the form class, and the names
+        of the class and of `run`, separates the results of different
+        forms sharing a cache_dir.
+        """
+        if cache_dir is None:
+            cache_dir = os.path.expanduser('~/.tkform_cache')
+        if namespace is None:
+            run_fn = self.process_fn or self.run
+            # scripts all have the module __main__, so the file is used
+            module = sys.modules.get(self.__class__.__module__)
+            fname = getattr(module, '__file__', None) or ''
+            namespace = '%s:%s.%s' % (
+                os.path.abspath(fname) if fname else '',
+                self.__class__.__name__, getattr(run_fn, '__name__', ''))
+        self.result_cache = ResultCache(cache_dir, namespace, max_results)
+
+    def store_result(self):
+        if self.captured_output is not None and self.result_cache is not None:
+            self.result_cache.put(self.capture_key, self.captured_output)
+        self.captured_output = None
+
+    def replay_result(self):
+        "Shows the cached output for capture_key, if there is one."
+        segments = self.result_cache.get(self.capture_key)
+        if segments is None:
+            return False
+        self.drop_job()
+        for segment in segments:
+            self.print_output(*segment)
+        return True
+
+    def submit(self, use_cache=True):
+        """
+        Runs the form with the current params. If the result cache is
+        enabled and use_cache is True, a cached output for the same
+        params is shown instead of running again. With a job table,
+        the params are queued as a new job instead.
+        """
+        if self.is_job_queue:
+            try:
+                self.queue_job(self.get_params())
+            except:
+                self.print_exception()
+            return
+        if self.is_output_pushed:
             self.clear_output()
+        self.captured_output = None
+        is_replayed = False
         try:
             params = self.get_params()
-            self.run(params)
+            if self.result_cache is not None:
+                self.capture_key = self.result_cache.get_key(params)
+                is_replayed = use_cache and self.replay_result()
+                if not is_replayed:
+                    self.captured_output = []
+            if not is_replayed:
+                if self.is_threaded or self.process_fn is not None:
+                    self.start_job(params)
+                else:
+                    self.run(params)
+                    self.store_result()
         except:
             self.print_exception()
+        if self.is_output_pushed:
+            self.flush_output()
+
+    def start_live(self, delay=300):
+        """
+        Submits the form automatically, delay ms after the last
+        change to any param. With `is_threaded` or `process_fn`, a
+        run that is still going when the next one is due is cancelled,
+        and the next run starts once its worker has returned, with the
+        params at that time. Only the output of the latest run is
+        shown.
+        """
+        self.live_delay = delay
+        if not self.is_live:
+            self.is_live = True
+            self.subscribe_param(self.on_live_change)
+
+    def stop_live(self):
+        if self.is_live:
+            self.is_live = False
+            self.unsubscribe_param(self.on_live_change)
+        if self.live_id is not None:
+            self.after_cancel(self.live_id)
+            self.live_id = None
+        self.is_live_pending = False
+
+    def on_live_change(self, param_id, value):
+        if self.live_id is not None:
+            self.after_cancel(self.live_id)
+        self.live_id = self.after(self.live_delay, self.live_submit)
+
+    def live_submit(self):
+        self.live_id = None
+        self.drop_job()
+        if self.dropped_jobs:
+            # one run at a time: `finish_job` calls this again once the
+            # cancelled workers have returned
+            self.is_live_pending = True
+            return
+        self.is_live_pending = False
+        self.submit()
+
+    def add_sweep_param(self, param_id):
+        """
+        Marks a param as an axis of `sweep`. A radio or checkbox param
+        is swept over all its choices, a list param over its rows,
+        each given to `run` as a list of one row.
+        """
+        self.sweep_params.append(param_id)
+
+    def get_sweep_axis(self, param_id, value):
+        "Returns a list of (value, description) for a sweep param."
+        if param_id in self.param_choices:
+            return [(choice, str(choice))
+                    for choice in self.param_choices[param_id]]
+        if not isinstance(value, list):
+            raise ValueError(
+                'Sweep param %r is not a choice or list param' % param_id)
+        return [([row], os.path.basename(row[0])) for row in value]
+
+    def sweep(self):
+        """
+        Runs the form for every combination of the values of the
+        sweep params. The output of each run is shown in its own
+        group, which can be collapsed by clicking on its header.
+        """
+        if not self.is_output_pushed:
+            raise Exception("Output not initialized in Form")
+        self.init_workers()
+        params = self.get_params()
+        axes = [self.get_sweep_axis(param_id, params[param_id])
+                for param_id in self.sweep_params]
+        combos = list(itertools.product(*axes))
+
+        self.drop_job()
+        self.clear_output()
+        self.flush_output()
+        self.captured_output = None
+        self.collapsed_output_groups = set()
+        sweep_job = Job(params)
+        jobs = Queue.Queue()
+        for i_group, combo in enumerate(combos):
+            combo_params = collections.OrderedDict(params)
+            descriptions = []
+            for param_id, axis_value in zip(self.sweep_params, combo):
+                value, description = axis_value
+                combo_params[param_id] = value
+                descriptions.append('%s=%s' % (param_id, description))
+            job = Job(combo_params, i_group)
+            sweep_job.children.append(job)
+            jobs.put(job)
+            self.push_output_group(i_group, ', '.join(descriptions))
+        self.open_output_groups(len(combos))
+        self.update_sweep_progress(sweep_job)
+
+        self.job = sweep_job
+        self.update_submit_button()
+        n_worker = self.sweep_workers
+        if n_worker is None:
+            import multiprocessing
+            n_worker = multiprocessing.cpu_count()
+        for i in range(min(n_worker, len(combos))):
+            thread = threading.Thread(
+                target=self.run_sweep_worker, args=(sweep_job, jobs))
+            thread.daemon = True
+            thread.start()
+        if not combos:
+            self.finish_job(sweep_job)
+        if not self.is_polling:
+            self.poll_gui_queue()
+
+    def run_sweep_worker(self, sweep_job, jobs):
+        "Executed on a worker thread, runs jobs until none are left."
+        while not sweep_job.is_cancelled:
+            try:
+                job = jobs.get_nowait()
+            except Queue.Empty:
+                break
+            self.execute_job(job)
+            self.call_in_gui(self.finish_sweep_job, sweep_job, job)
+
+    def finish_sweep_job(self, sweep_job, job):
+        sweep_job.n_done += 1
+        self.update_sweep_progress(sweep_job)
+        if sweep_job.n_done == len(sweep_job.children):
+            self.finish_job(sweep_job)
+
+    def update_sweep_progress(self, sweep_job):
+        text = 'Sweep: %d of %d runs done\n' % (
+            sweep_job.n_done, len(sweep_job.children))
+        ranges = self.output.tag_ranges('sweep-progress')
+        if ranges:
+            self.output.delete(ranges[0], ranges[1])
+            self.output.insert(ranges[0], text, 'sweep-progress')
+        else:
+            self.output.insert('1.0', text, 'sweep-progress')
+        self.resize_output()
+
+    def push_output_group(self, i_group, description):
+        """
+        Adds a clickable header for the output of a run of a sweep,
+        followed by the mark where its output is inserted.
+        """
+        tag = 'group-%d' % i_group
+        link_tag = self.output_link_manager.add_new_link(
+            lambda: self.toggle_output_group(tag))
+        header = '[%d] %s\n' % (i_group + 1, description)
+        self.output.insert(tk.END, header, link_tag)
+        self.output.tag_configure(tag, elide=False)
+        # left gravity keeps the mark before the next header, it is
+        # switched to right gravity in `open_output_groups`
+        mark = tag + '-end'
+        self.output.mark_set(mark, 'end-1c')
+        self.output.mark_gravity(mark, tk.LEFT)
+        self.resize_output()
+
+    def open_output_groups(self, n_group):
+        # with right gravity, each mark moves past output inserted at it
+        for i_group in range(n_group):
+            self.output.mark_gravity('group-%d-end' % i_group, tk.RIGHT)
+
+    def print_group_output(self, i_group, out_str, cmd_fn=None, tag=None):
+        group_tag = 'group-%d' % i_group
+        tags = (group_tag,)
+        if cmd_fn is not None:
+            tags += self.output_link_manager.add_new_link(cmd_fn)
+        if tag is not None:
+            tags += (tag,)
+        self.output.insert(
+            group_tag + '-end', ''.join(self.wrap_output(out_str)), tags)
+        if self.output_max_lines is not None:
+            self.trim_output_group(group_tag)
+        self.resize_output()
+
+    def trim_output_group(self, group_tag):
+        "Deletes the oldest lines of a group beyond output_max_lines."
+        ranges = self.output.tag_ranges(group_tag)
+        start = str(ranges[0])
+        n_extra = count_lines(start, ranges[-1]) - self.output_max_lines
+        if n_extra > 0:
+            self.output.delete(start, '%s + %d lines' % (start, n_extra))
+            self.output_link_manager.prune(is_all=True)
+
+    def toggle_output_group(self, tag):
+        if tag in self.collapsed_output_groups:
+            self.collapsed_output_groups.remove(tag)
+            self.output.tag_configure(tag, elide=False)
+        else:
+            self.collapsed_output_groups.add(tag)
+            self.output.tag_configure(tag, elide=True)
+        self.resize_output()
+
+    def resize_output(self):
+        "Sets the height of a growing output area to its shown lines."
+        if self.output_height is not None:
+            return
+        n_line = count_lines('1.0', self.output.index('end-1c'))
+        if self.output.get('end-2c') != '\n':
+            n_line += 1
+        # the lines of collapsed groups are elided
+        for tag in self.collapsed_output_groups:
+            ranges = self.output.tag_ranges(tag)
+            for start, end in zip(ranges[::2], ranges[1::2]):
+                n_line -= count_lines(start, end)
+        self.output.configure(height=n_line)
+
+    def push_sweep(self, text='sweep'):
+        self.push_button(text, self.sweep)
+
+    def push_job_table(self, max_running=1, max_outputs=10, max_jobs=100):
+        """
+        Pushes a table of jobs, and turns on the job queue: each submit
+        queues a job with the current params, and up to max_running
+        jobs are run at once. The output of the last max_outputs
+        finished jobs is kept in memory, older output is moved to
+        temporary files. Only the last max_jobs jobs are listed.
+        """
+        self.max_running_jobs = max_running
+        self.max_job_outputs = max_outputs
+        self.max_jobs = max_jobs
+
+        def build():
+            self.job_table = ReadOnlyText(self.interior, width=60, height=1)
+            self.job_link_manager = HyperlinkManager(self.job_table)
+            self.push_row(self.job_table)
+            self.update_job_table()
+        self.defer_row(build)
+        self.is_job_queue = True
+
+    def queue_job(self, params):
+        job = Job(params)
+        self.n_queued_job += 1
+        job.i_job = self.n_queued_job
+        job.output = []
+        self.jobs.append(job)
+        self.prune_jobs()
+        self.show_job(job)
+        self.start_queued_jobs()
+
+    def start_queued_jobs(self):
+        self.init_workers()
+        for job in self.jobs:
+            if len(self.running_jobs) >= self.max_running_jobs:
+                break
+            if job.state != 'queued':
+                continue
+            job.state = 'running'
+            job.start_time = time.time()
+            self.running_jobs.append(job)
+            job.thread = threading.Thread(target=self.run_job, args=(job,))
+            job.thread.daemon = True
+            job.thread.start()
+        self.update_job_table()
+        if self.running_jobs and not self.is_polling:
+            self.poll_gui_queue()
+
+    def finish_queued_job(self, job):
+        if job.is_cancelled:
+            job.state = 'cancelled'
+        elif job.is_failed:
+            job.state = 'failed'
+        else:
+            job.state = 'done'
+        job.end_time = time.time()
+        # the params of a finished job are not needed anymore
+        job.params = None
+        self.running_jobs.remove(job)
+        if job is self.shown_job and self.is_output_pushed:
+            self.flush_output()
+        self.spill_job_outputs()
+        self.prune_jobs()
+        self.start_queued_jobs()
+
+    def cancel_queued_job(self, job):
+        if job.state not in ('queued', 'running'):
+            return
+        job.cancel()
+        if job.state == 'running':
+            # the worker keeps its place in running_jobs until `run`
+            # returns, so that no more than max_running jobs run
+            job.state = 'cancelling'
+            self.update_job_table()
+            return
+        job.state = 'cancelled'
+        job.params = None
+        self.spill_job_outputs()
+        self.prune_jobs()
+        self.update_job_table()
+
+    def prune_jobs(self):
+        "Drops the oldest finished jobs beyond max_jobs."
+        n_extra = len(self.jobs) - self.max_jobs
+        for job in list(self.jobs):
+            if n_extra <= 0:
+                break
+            if job.state in ('queued', 'running', 'cancelling'):
+                continue
+            self.jobs.remove(job)
+            n_extra -= 1
+            if job.output_fname is not None:
+                os.remove(job.output_fname)
+            if job is self.shown_job:
+                self.shown_job = None
+
+    def spill_job_outputs(self):
+        "Moves the output of older finished jobs to temporary files."
+        finished_jobs = [
+            job for job in self.jobs
+            if job.state not in ('queued', 'running', 'cancelling')
+            and job.output is not None]
+        n_extra = len(finished_jobs) - self.max_job_outputs
+        if n_extra <= 0:
+            return
+        if self.job_spill_dir is None:
+            self.job_spill_dir = tempfile.mkdtemp(prefix='tkform_jobs_')
+            atexit.register(shutil.rmtree, self.job_spill_dir, True)
+        for job in finished_jobs[:n_extra]:
+            try:
+                data = pickle.dumps(job.output, pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                # links that can't be pickled are dropped
+                segments = [
+                    (segment[0], None) + segment[2:]
+                    for segment in job.output]
+                data = pickle.dumps(segments, pickle.HIGHEST_PROTOCOL)
+            job.output_fname = os.path.join(
+                self.job_spill_dir, 'job%d.pickle' % job.i_job)
+            with open(job.output_fname, 'wb') as f:
+                f.write(data)
+            job.output = None
+
+    def get_job_output(self, job):
+        if job.output is not None:
+            return job.output
+        if job.output_fname is not None:
+            with open(job.output_fname, 'rb') as f:
+                return pickle.load(f)
+        return []
+
+    def show_job(self, job):
+        "Shows the output of job in the output area."
+        self.shown_job = job
+        if self.is_output_pushed:
+            self.clear_output()
+            self.captured_output = None
+            for segment in self.get_job_output(job):
+                self.print_output(*segment)
+            self.flush_output()
+        self.update_job_table()
+
+    def update_job_table(self):
+        if self.job_table is None:
+            return
+        if self.job_table_id is not None:
+            self.after_cancel(self.job_table_id)
+            self.job_table_id = None
+        self.job_table.delete('1.0', tk.END)
+        self.job_link_manager.reset()
+        for job in self.jobs:
+            line = '%s #%d  %-10s %7.1f s  ' % (
+                '>' if job is self.shown_job else ' ',
+                job.i_job, job.state, job.get_duration())
+            self.job_table.insert(tk.END, line)
+            link_tag = self.job_link_manager.add_new_link(
+                self.get_job_callback(self.show_job, job))
+            self.job_table.insert(tk.END, 'output', link_tag)
+            if job.state in ('queued', 'running'):
+                self.job_table.insert(tk.END, '  ')
+                link_tag = self.job_link_manager.add_new_link(
+                    self.get_job_callback(self.cancel_queued_job, job))
+                self.job_table.insert(tk.END, 'cancel', link_tag)
+            self.job_table.insert(tk.END, '\n')
+        self.job_table.configure(height=max(1, len(self.jobs)))
+        if self.running_jobs:
+            # refreshes the durations of the running jobs
+            self.job_table_id = self.after(1000, self.update_job_table)
+
+    def get_job_callback(self, fn, job):
+        return lambda: fn(job)
 
     def push_submit(self):
-        self.push_button('submit', self.submit)
+        def build():
+            self.submit_button = tk.Button(
+                self.interior, text='submit', command=self.submit)
+            self.push_row(self.submit_button)
+            self.update_submit_button()
+        self.defer_row(build)
+
+
+class HeadlessForm(object):
+
+    """
+    Replaces Form when `is_headless()`, to run the same form in
+    scripts and on machines without a display.
+
+    The params declared with push_labeled_param, push_checkbox_param,
+    push_radio_param, push_file_list_param and push_dir_list_param
+    become command-line options, with the same defaults as the form.
+    `mainloop` parses sys.argv and calls `run` (or `process_fn`) with
+    the params. Output is written to stdout. Decorations, buttons and
+    the output area are ignored.
+    """
+
+    def __init__(self, title='', width=700, height=800, parent=None):
+        self.parent = parent
+        import argparse
+        self.parser = argparse.ArgumentParser(description=title)
+        self.parser.add_argument(
+            '--headless', action='store_true',
+            help='run without a window')
+        self.param_converters = collections.OrderedDict()
+        self.param_entries = collections.OrderedDict()
+        self.params = None
+        self.is_threaded = False
+        self.process_fn = None
+        self.exit_code = 0
+
+    def title(self, text):
+        pass
+
+    def update(self):
+        pass
+
+    def push_row(self, widget):
+        pass
+
+    def push_text(self, text, fontsize=12):
+        pass
+
+    def push_spacer(self, height=1):
+        pass
+
+    def push_line(self, width=500, height=1, color="#999999"):
+        pass
+
+    def push_button(self, text, command_fn):
+        pass
+
+    def push_submit(self):
+        pass
+
+    def push_output(
+            self, width=70, flush_interval=None, max_lines=None, height=None):
+        pass
+
+    def push_param_option(self, param_id, convert, **kwargs):
+        self.parser.add_argument('--' + param_id, dest=param_id, **kwargs)
+        self.param_converters[param_id] = convert
+
+    def push_labeled_param(
+            self, param_id, text, entry_text='',
+            load_file_text=None, load_dir_text=None,
+            width=None):
+        self.push_param_option(
+            param_id, str, default=entry_text, help=text)
+
+    def push_file_list_param(
+            self, param_id, load_file_text, is_label=True, is_virtual=False,
+            metadata=None, is_tools=False):
+        self.push_fname_list_option(
+            param_id, load_file_text, is_label, metadata)
+
+    def push_fname_list_option(
+            self, param_id, help, is_label, metadata, expand_fn=None):
+        def convert(fnames):
+            if expand_fn is not None:
+                fnames = expand_fn(fnames)
+            rows = []
+            seen_fnames = set()
+            for fname in fnames:
+                # as in the tables of the form, files are only added once
+                if fname in seen_fnames:
+                    continue
+                seen_fnames.add(fname)
+                row = [fname]
+                if is_label:
+                    row.append(os.path.basename(fname))
+                if metadata:
+                    try:
+                        info = file_info_cache.get_info(
+                            fname, 'hash' in metadata)
+                    except (IOError, OSError):
+                        info = {}
+                    row.extend(info.get(column) for column in metadata)
+                rows.append(row)
+            return rows
+        self.push_param_option(
+            param_id, convert, nargs='*', default=[], metavar='FILE',
+            help=help)
+
+    def push_dir_list_param(
+            self, param_id, load_dir_text, is_label=True, is_virtual=False,
+            metadata=None, is_expand=False, include=None, exclude=None,
+            is_tools=False):
+        if is_expand:
+            expand_fn = lambda dirs: [
+                fname for the_dir in dirs
+                for fname in walk_files(the_dir, include, exclude)]
+        else:
+            expand_fn = None
+        self.push_fname_list_option(
+            param_id, load_dir_text, is_label, metadata, expand_fn)
+
+    def push_checkbox_param(self, param_id, text, init_val='1'):
+        self.push_param_option(
+            param_id, int, type=int, default=int(init_val),
+            choices=[0, 1], help=text)
+
+    def push_radio_param(self, param_id, text_list, init_val=0):
+        choices = ', '.join(
+            '%d: %s' % (i, text) for i, text in enumerate(text_list))
+        self.push_param_option(
+            param_id, int, type=int, default=int(init_val),
+            choices=range(len(text_list)), help=choices)
+
+    def parse_args(self, args=None):
+        namespace = self.parser.parse_args(args)
+        self.params = collections.OrderedDict()
+        for param_id, convert in self.param_converters.items():
+            self.params[param_id] = convert(getattr(namespace, param_id))
+
+    def get_params(self):
+        if self.params is None:
+            self.parse_args()
+        return collections.OrderedDict(self.params)
+
+    def subscribe_param(self, fn, param_id=None):
+        pass
+
+    def unsubscribe_param(self, fn):
+        pass
+
+    def start_live(self, delay=300):
+        pass
+
+    def add_sweep_param(self, param_id):
+        pass
+
+    def push_sweep(self, text='sweep'):
+        pass
+
+    def push_job_table(self, max_running=1, max_outputs=10, max_jobs=100):
+        pass
+
+    def stop_live(self):
+        pass
+
+    def clear_output(self):
+        pass
+
+    def print_output(self, out_str, cmd_fn=None, tag=None):
+        if tag == 'stderr':
+            sys.stderr.write(out_str)
+        else:
+            sys.stdout.write(out_str)
+
+    def run_command(self, args, cwd=None, env=None, max_lines=10000):
+        sys.stdout.flush()
+        returncode = subprocess.call(args, cwd=cwd, env=env)
+        if returncode != 0:
+            sys.stderr.write('\nExited with code %d.\n' % returncode)
+        return returncode
+
+    def flush_output(self):
+        sys.stdout.flush()
+
+    def print_exception(self, exc_str=None):
+        if exc_str is None:
+            exc_str = traceback.format_exc()
+        sys.stderr.write(exc_str)
+
+    def is_cancelled(self):
+        return False
+
+    def run(self, params):
+        "Dummy method to be overriden/replaced."
+        pass
+
+    def enable_result_cache(
+            self, cache_dir=None, max_results=100, namespace=None):
+        pass
+
+    def submit(self, use_cache=True):
+        params = self.get_params()
+        try:
+            if self.process_fn is not None:
+                self.process_fn(params, self.print_output)
+            else:
+                self.run(params)
+        except:
+            self.print_exception()
+            self.exit_code = 1
+        self.flush_output()
+
+    def mainloop(self):
+        self.submit()
+        if self.exit_code:
+            sys.exit(self.exit_code)
+
+
+if is_headless():
+    Form = HeadlessForm